@@ -1,16 +1,40 @@
-import torch, timm
+import logging, threading, time, statistics
+import torch
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import torchvision.transforms as transforms
-from efficientnet_pytorch import EfficientNet
-import torch.nn as nn
-from torchvision.models import efficientnet_v2_m, EfficientNet_V2_M_Weights
+from preprocess import ArrayPreprocessor
+from event_log import get_logger, EVENTS
+from stage_timer import TIMER
+
+log = get_logger("ai_analyzer")
 
 class AIAnalyzer:
-    def __init__(self, device, ripeness_scores, bruises_scores, size_scores):
+    def __init__(self, device, ripeness_scores, bruises_scores, size_scores,
+                 multihead=False, merged_path=None, quantize=None, quant_backend="qnnpack",
+                 backend="torch", allow_unvalidated=False):
         self.device = device
+        # multihead: one shared backbone for both heads (see multihead_model.py)
+        self.multihead = multihead
+        self.merged_path = merged_path
+        # without merged_path the multi-head model is only built for experiments
+        self.allow_unvalidated = allow_unvalidated
+        # quantize: None (fp32) or 'static' INT8 (see quantize_models.py), CPU only
+        self.quantize = quantize
+        self.quant_backend = quant_backend
+        # backend: 'torch' builds the timm models, 'torchscript'/'onnx' load the
+        # artifacts written by export_models.py (see inference_backend.py)
+        self.backend = backend
         self.RIPENESS_SCORES = ripeness_scores
         self.BRUISES_SCORES = bruises_scores
         self.SIZE_SCORES = size_scores
         self.transform = self.create_transform()
+        self.preprocessor = ArrayPreprocessor(self.tf_params)
+        # runs the ripeness head next to the bruises head in predict()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # the preprocessed batch is a view of one shared buffer, so one predict()
+        # at a time (the GUI worker and auto mode can both call it)
+        self.predict_lock = threading.Lock()
         self.load_models()
     def get_is_ripeness(self):
         return True
@@ -60,6 +84,26 @@ class AIAnalyzer:
         print("loaded the ripeness and bruises model")
     
     def load_models(self):
+        if self.backend != "torch":
+            from inference_backend import load_classifier
+            self.model_ripeness = load_classifier("ripeness_v2b3.pth", self.backend, self.device)
+            self.model_bruises = load_classifier("bruises_v2b3.pth", self.backend, self.device)
+            return
+
+        if self.multihead:
+            from multihead_model import load_multihead_model
+            self.model_multihead = load_multihead_model(
+                self.device, len(self.RIPENESS_SCORES), len(self.BRUISES_SCORES),
+                merged_path=self.merged_path, allow_unvalidated=self.allow_unvalidated)
+            return
+
+        if self.quantize:
+            # the INT8 TorchScript files are complete models, no fp32 build first
+            self.load_quantized_models()
+            return
+
+        import timm
+
         # Load ripeness model (EfficientNetV2-M)
         # TODO: this is the best method for now
         #weights = EfficientNet_V2_M_Weights.IMAGENET1K_V1
@@ -96,17 +140,29 @@ class AIAnalyzer:
         ) # bruises_v2b3 
         self.model_bruises.eval()
 
-        print("Loaded ripeness and bruises models (EfficientNetV2-B3)")
+        log.info("Loaded ripeness and bruises models (EfficientNetV2-B3)")
+
+    def load_quantized_models(self):
+        import quantize_models
+        if self.quantize != 'static':
+            raise ValueError(f"Unknown quantize mode {self.quantize!r}, expected None or 'static'")
+        quantize_models.set_backend(self.quant_backend)
+        # calibrated and saved by `python quantize_models.py calibrate`
+        self.model_ripeness = torch.jit.load(quantize_models.QUANTIZED_PATHS['ripeness'])
+        self.model_bruises = torch.jit.load(quantize_models.QUANTIZED_PATHS['bruises'])
+        log.info("Using static INT8 ripeness and bruises models")
                   
     def get_predicted_class(self, image, isRipeness):
         image = self.transform(image).unsqueeze(0).to(self.device)
         
         with torch.no_grad():  # Disable gradient computation for inference
+            if self.multihead:
+                ripeness_output, bruises_output = self.model_multihead(image)
             if (isRipeness):
-                output = self.model_ripeness(image)
+                output = ripeness_output if self.multihead else self.model_ripeness(image)
                 class_labels = list(self.RIPENESS_SCORES.keys())
             else:
-                output = self.model_bruises(image)            
+                output = bruises_output if self.multihead else self.model_bruises(image)
                 class_labels = list(self.BRUISES_SCORES.keys())
             
             # Apply softmax to get probabilities
@@ -118,22 +174,85 @@ class AIAnalyzer:
             predicted_class = class_labels[predicted.item()]
             confidence_score = confidence.item()
             
-            # Display confidence information
-            print(f"Predicted class: {predicted_class}")
-            print(f"Confidence: {confidence_score:.4f} ({confidence_score*100:.2f}%)")
-            
-            # Optional: Display all class probabilities
-            print("All class probabilities:")
-            for i, label in enumerate(class_labels):
-                prob = probabilities[0][i].item()
-                print(f"  {label}: {prob:.4f} ({prob*100:.2f}%)")
+            log.debug("Predicted class: %s, confidence %.4f", predicted_class, confidence_score)
+            # per-class probabilities cost a .item() sync each, only when asked for
+            if log.isEnabledFor(logging.DEBUG):
+                for label, prob in zip(class_labels, probabilities[0].tolist()):
+                    log.debug("  %s: %.4f", label, prob)
             
             return predicted_class
         
+    def prepare_batch(self, images, boxes=None):
+        # camera ndarrays skip PIL entirely, PIL images keep the Compose transform.
+        # boxes[i] (or None) crops image i to [x1, y1, x2, y2] before the resize
+        if all(isinstance(image, np.ndarray) for image in images):
+            batch = self.preprocessor.to_tensor(images, boxes)
+        else:
+            boxes = boxes or [None] * len(images)
+            batch = torch.stack([self.transform(image.crop(box) if box else image)
+                                 for image, box in zip(images, boxes)])
+        return batch.to(self.device)
+
+    def predict(self, images, boxes=None):
+        # one shared preprocessed batch for every image, both models run on it
+        with self.predict_lock:
+            with TIMER.span("transform"):
+                batch = self.prepare_batch(images, boxes)
+            ripeness_output, bruises_output = self.run_models(batch)
+
+        ripeness = self.decode_output(ripeness_output, list(self.RIPENESS_SCORES.keys()))
+        bruises = self.decode_output(bruises_output, list(self.BRUISES_SCORES.keys()))
+
+        results = []
+        for (r_class, r_conf), (b_class, b_conf) in zip(ripeness, bruises):
+            log.debug("Predicted ripeness: %s (%.2f%%), bruises: %s (%.2f%%)",
+                      r_class, r_conf * 100, b_class, b_conf * 100)
+            EVENTS.add("prediction", ripeness=r_class, ripeness_confidence=r_conf,
+                       bruises=b_class, bruises_confidence=b_conf)
+            results.append({'ripeness': r_class, 'ripeness_confidence': r_conf,
+                            'bruises': b_class, 'bruises_confidence': b_conf})
+        return results
+
+    def run_models(self, batch):
+        if self.multihead:
+            return self.run_model(self.model_multihead, batch, "classifiers")
+        ripeness_future = self.executor.submit(self.run_model, self.model_ripeness, batch, "ripeness")
+        bruises_output = self.run_model(self.model_bruises, batch, "bruises")
+        return ripeness_future.result(), bruises_output
+
+    def warm_up(self, frame_size=(1080, 1920), batch_sizes=(1, 2), runs=3):
+        # Runs dummy camera frames through preprocessing (full size down to 300x300)
+        # and both models, so the first real mango doesn't pay for allocation and
+        # kernel selection. Returns first call vs steady state ms per batch size.
+        stats = {}
+        for batch_size in batch_sizes:
+            images = [np.zeros((*frame_size, 3), dtype=np.uint8)] * batch_size
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                with self.predict_lock:
+                    self.run_models(self.prepare_batch(images))
+                times.append((time.perf_counter() - start) * 1000)
+            stats[batch_size] = {'first_ms': times[0], 'steady_ms': statistics.median(times[1:])}
+            log.info("Classifier warm-up, batch %d: first %.0f ms, steady %.0f ms",
+                     batch_size, times[0], stats[batch_size]['steady_ms'])
+        self.warmup_stats = stats
+        return stats
+
+    def run_model(self, model, batch, stage="classifiers"):
+        # no_grad is thread-local so it has to be entered on the worker thread too
+        with torch.no_grad(), TIMER.span(stage):
+            return model(batch)
+
+    def decode_output(self, output, class_labels):
+        probabilities = torch.softmax(output, dim=1)
+        confidence, predicted = torch.max(probabilities, 1)
+        return [(class_labels[p], c) for p, c in zip(predicted.tolist(), confidence.tolist())]
+
     def get_overall_grade(self, scores, predicted):
         resulting_grade = (predicted['ripeness']*self.RIPENESS_SCORES[scores['ripeness']] +
             predicted['bruises']*self.BRUISES_SCORES[scores['bruises']] +
             predicted['size']*self.SIZE_SCORES[scores['size']])
-        print(f"Resulting Grade: {resulting_grade}")
+        log.debug("Resulting Grade: %s", resulting_grade)
         return resulting_grade
 
@@ -0,0 +1,191 @@
+import queue, threading, time
+from collections import deque
+from datetime import datetime
+from runtime_config import pin_current_thread
+from stage_timer import TIMER
+from event_log import get_logger
+
+log = get_logger("auto_sorter")
+
+class AutoSortPipeline:
+    # Continuous sorting without an operator. Each mango moves through
+    #   feed (belt advance + top/bottom capture) -> inference -> grade -> sort
+    # with one thread per stage and small bounded queues in between, so mango
+    # N+1 is already on the belt and being captured while mango N is classified.
+    # The belt only carries a mango into the sorter once its grade is set there
+    # ('sorter_distance' belt cycles after its bottom capture).
+    # Usually built with GradingEngine.create_auto_pipeline.
+    def __init__(self, engine, settings, img_dir, on_result=None):
+        self.engine = engine
+        self.mc = engine.mc
+        self.sort = engine.sort
+        self.camera = engine.camera
+        self.settings = settings
+        self.img_dir = img_dir
+        self.on_result = on_result  # (mango, stats), called from the sort thread
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.completed = 0
+        self.started = None
+        # captured but not sorted yet, saved ungraded if they never get there
+        self.in_flight = {}
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def start(self):
+        if self.is_running():
+            return
+        self.stop_event.clear()
+        self.completed = 0
+        self.started = time.monotonic()
+        size = self.settings['queue_size']
+        to_inference = queue.Queue(maxsize=size)
+        to_grade = queue.Queue(maxsize=size)
+        to_sort = queue.Queue(maxsize=size)
+        runtime = self.engine.runtime
+        self.threads = [
+            threading.Thread(target=self.feed_stage, args=(to_inference, runtime['ui_cpus']), daemon=True),
+            threading.Thread(target=self.run_stage, args=(self.inference_stage, to_inference, to_grade,
+                                                          runtime['inference_cpus']), daemon=True),
+            threading.Thread(target=self.run_stage, args=(self.grade_stage, to_grade, to_sort), daemon=True),
+            threading.Thread(target=self.run_stage, args=(self.sort_stage, to_sort, None), daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        log.info("Auto mode started, target %s mangoes/min", self.settings['target_per_minute'])
+
+    def stop(self, wait=True):
+        # wait=False returns at once (the GUI's Tk thread) and lets a background
+        # thread wait for the stages to finish their current mango
+        self.stop_event.set()
+        self.mc.stop_motors()
+        threads, self.threads = self.threads, []
+        finisher = threading.Thread(target=self.finish, args=(threads,), daemon=True)
+        finisher.start()
+        if wait:
+            finisher.join()
+
+    def finish(self, threads):
+        for thread in threads:
+            thread.join()
+        self.mc.stop_motors()
+        # whatever was still queued or being graded is kept ungraded in img_dir
+        for mango in list(self.in_flight.values()):
+            self.drop(mango)
+        log.info("Auto mode stopped after %d mangoes", self.completed)
+
+    def get_stats(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        rate = self.completed / elapsed * 60 if elapsed > 0 else 0.0
+        return {'completed': self.completed, 'elapsed': elapsed,
+                'per_minute': rate, 'target_per_minute': self.settings['target_per_minute']}
+
+    def put(self, outbox, mango):
+        # blocks while the next stage is full, but still notices stop()
+        while not self.stop_event.is_set():
+            try:
+                outbox.put(mango, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run_stage(self, work, inbox, outbox, cpus=None):
+        pin_current_thread(cpus)
+        while not self.stop_event.is_set():
+            try:
+                mango = inbox.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                work(mango)
+            except Exception as e:
+                log.error("Auto mode error on %s: %s", mango['recorded_time'], e)
+                self.drop(mango)
+                continue
+            if outbox is not None:
+                self.put(outbox, mango)
+
+    def drop(self, mango):
+        # ungraded: captures into img_dir, and the belt may move on without it
+        if self.in_flight.pop(mango['recorded_time'], None) is None:
+            return
+        self.engine.save_captures(mango['recorded_time'], mango['images'], self.img_dir)
+        mango['sorted'].set()
+
+    def wait_sorted(self, mango):
+        while not mango['sorted'].wait(0.2):
+            if self.stop_event.is_set():
+                return False
+        return True
+
+    def advance_belt(self, motor_array, seconds):
+        self.mc.set_motors(motor_array)
+        self.stop_event.wait(seconds)
+        self.mc.stop_motors()
+
+    def capture(self):
+        # first frame taken after the belt has stopped
+        with TIMER.span("capture"):
+            return self.camera.get_full_frame(after=time.monotonic())
+
+    def feed_stage(self, outbox, cpus=None):
+        pin_current_thread(cpus)
+        period = 60.0 / self.settings['target_per_minute']
+        last_time, same_second = None, 0
+        # captured mangoes still between the camera and the sorter, oldest first
+        on_belt = deque()
+        while not self.stop_event.is_set():
+            cycle_start = time.monotonic()
+            recorded_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            # keep file names unique when the belt is faster than one mango a second
+            same_second = same_second + 1 if recorded_time == last_time else 0
+            last_time = recorded_time
+            if same_second:
+                recorded_time += f"_{same_second}"
+            # this move carries the oldest mango into the sorter: its grade has to be set
+            ejecting = len(on_belt) >= self.settings['sorter_distance']
+            if ejecting and not self.wait_sorted(on_belt[0]):
+                break
+            self.advance_belt(self.settings['top_move'], self.settings['top_time'])
+            if ejecting:
+                on_belt.popleft()
+                # like the manual flow, the sorter is reset once the mango is through
+                self.sort.stop_motors()
+            if self.stop_event.is_set():
+                break
+            top = self.capture()
+            self.advance_belt(self.settings['bottom_move'], self.settings['bottom_time'])
+            if self.stop_event.is_set():
+                break
+            bottom = self.capture()
+            mango = {'recorded_time': recorded_time, 'images': {'top': top, 'bottom': bottom},
+                     'sorted': threading.Event()}
+            self.in_flight[recorded_time] = mango
+            on_belt.append(mango)
+            if not self.put(outbox, mango):
+                break
+            # pace the belt to the configured mangoes per minute
+            self.stop_event.wait(max(0.0, period - (time.monotonic() - cycle_start)))
+
+    def inference_stage(self, mango):
+        ai_preds = self.engine.analyze(mango['images'], mango['recorded_time'], self.img_dir)
+        mango['top_pred'] = ai_preds['top']
+        mango['bottom_pred'] = ai_preds['bottom']
+
+    def grade_stage(self, mango):
+        mango.update(self.engine.grade_predictions(mango['top_pred'], mango['bottom_pred']))
+
+    def sort_stage(self, mango):
+        self.engine.sort_mango(mango['letter'])
+        self.in_flight.pop(mango['recorded_time'], None)
+        mango['sorted'].set()
+        self.engine.save_captures(mango['recorded_time'], mango['images'],
+                                  self.engine.grade_folder(self.img_dir, mango['letter']))
+        self.completed += 1
+        stats = self.get_stats()
+        log.info("Auto mode: %s Grade %s, %.1f/%s mangoes/min", mango['recorded_time'],
+                 mango['letter'], stats['per_minute'], stats['target_per_minute'])
+        if self.on_result:
+            self.on_result(mango, stats)
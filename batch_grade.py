@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# Regrades saved sessions offline, e.g. after changing priorities or models. Every
+# <time>_top / <time>_bottom pair under the given session folders goes through the
+# full grading stack (RCNN, classifiers, formula) in a process pool with one
+# GradingEngine per worker, and each result is streamed to a CSV or Parquet file.
+#
+#   python batch_grade.py 2025-01-01_10-00-00 --output regrade.csv
+#   python batch_grade.py 2025-01-01_* --priorities 3 1 2 --workers 2 --output regrade.parquet
+#
+# Without --priorities every session uses the ones saved in its input_priorities.txt.
+# Parquet output needs pyarrow.
+
+import argparse, csv, glob, os, re, sys, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+DEFAULT_PRIORITIES = {'ripeness': 3.0, 'bruises': 3.0, 'size': 3.0}
+SIDE_FIELDS = ['ripeness', 'bruises', 'size', 'source']
+FIELDS = (['session', 'mango', 'saved_letter', 'letter', 'ave_score', 'top_score', 'bottom_score'] +
+          [f"{side}_{key}" for side in ('top', 'bottom') for key in SIDE_FIELDS] +
+          ['top_path', 'bottom_path', 'error'])
+
+# one engine per worker process, built by init_worker
+ENGINE = None
+
+def read_priorities(session):
+    # input_priorities.txt as written by GradingEngine.create_session
+    path = os.path.join(session, "input_priorities.txt")
+    if not os.path.exists(path):
+        return dict(DEFAULT_PRIORITIES)
+    priorities = dict(DEFAULT_PRIORITIES)
+    with open(path) as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key.strip() in priorities and value.strip():
+                priorities[key.strip()] = float(value)
+    return priorities
+
+def find_pairs(session):
+    # (mango, top, bottom, saved letter) for every top capture that has a bottom
+    pairs = []
+    for top in sorted(glob.glob(os.path.join(session, "**", "*_top.*"), recursive=True)):
+        base, ext = os.path.splitext(top)
+        bottom = base[:-len("_top")] + "_bottom" + ext
+        if not os.path.exists(bottom):
+            print(f"Skipping {top}, no bottom capture")
+            continue
+        folder = re.match(r"Grade-([A-Z])$", os.path.basename(os.path.dirname(top)))
+        pairs.append((os.path.basename(base[:-len("_top")]), top, bottom,
+                      folder.group(1) if folder else ""))
+    return pairs
+
+def init_worker(settings, threads):
+    global ENGINE
+    # the per-mango engine output from several workers would only interleave;
+    # failures come back in the result rows
+    sys.stdout = open(os.devnull, "w")
+    from grading_engine import GradingEngine
+    ENGINE = GradingEngine(settings)
+    if not ENGINE.models_ready.is_set():
+        raise RuntimeError(f"Models did not load: {ENGINE.load_errors}")
+    if threads:
+        # split the cores between the workers instead of runtime_config.json's count
+        import torch
+        torch.set_num_threads(threads)
+
+def grade_pair(task):
+    import cv2
+    session, priorities, (mango, top_path, bottom_path, saved_letter) = task
+    row = {'session': session, 'mango': mango, 'saved_letter': saved_letter,
+           'top_path': top_path, 'bottom_path': bottom_path, 'error': ""}
+    try:
+        top, bottom = [cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+                       for path in (top_path, bottom_path)]
+        ENGINE.formula.set_input_priority(priorities)
+        result = ENGINE.grade_mango(top, bottom, recorded_time=mango, sort=False)
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+        return row
+    row.update({key: result[key] for key in ('letter', 'ave_score', 'top_score', 'bottom_score')})
+    for side in ('top', 'bottom'):
+        for key in SIDE_FIELDS:
+            row[f"{side}_{key}"] = result[f"{side}_pred"].get(key, "")
+    return row
+
+class CsvSink:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        # rows are on disk as they finish, so a long run can be watched
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ParquetSink:
+    def __init__(self, path, batch_size=256):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Parquet output needs pyarrow (pip install pyarrow), or use a .csv output")
+        self.pa = pa
+        number = {'ave_score', 'top_score', 'bottom_score'}
+        self.schema = pa.schema([(name, pa.float64() if name in number else pa.string())
+                                 for name in FIELDS])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.batch_size = batch_size
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            columns = {name: [row.get(name) for row in self.rows] for name in FIELDS}
+            self.writer.write_table(self.pa.table(columns, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+def open_sink(path):
+    if path.lower().endswith(".parquet"):
+        return ParquetSink(path)
+    return CsvSink(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Regrade saved session folders")
+    parser.add_argument("sessions", nargs="+", help="Session folders (the Grade-X subfolders are searched)")
+    parser.add_argument("--output", default="regrade.csv", help=".csv or .parquet")
+    parser.add_argument("--priorities", nargs=3, type=float, metavar=("RIPENESS", "BRUISES", "SIZE"),
+                        help="Override the priorities saved with each session")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--threads", type=int, help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--backend", choices=["torch", "torchscript", "onnx"], default="torch")
+    parser.add_argument("--rcnn-labels", type=float, metavar="CONFIDENCE",
+                        help="Use the RCNN ripeness/bruise labels at or above this confidence")
+    args = parser.parse_args()
+
+    tasks = []
+    for session in args.sessions:
+        priorities = (dict(zip(['ripeness', 'bruises', 'size'], args.priorities))
+                      if args.priorities else read_priorities(session))
+        name = os.path.basename(os.path.normpath(session))
+        tasks += [(name, priorities, pair) for pair in find_pairs(session)]
+    if not tasks:
+        sys.exit("No top/bottom pairs found")
+
+    settings = {'hardware': False, 'save_captures': False, 'save_annotated': False,
+                'warm_up': False, 'backend': args.backend,
+                'rcnn_label_confidence': args.rcnn_labels, 'log_level': "WARNING"}
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    print(f"Grading {len(tasks)} mangoes with {args.workers} workers x {threads} threads")
+
+    sink = open_sink(args.output)
+    letters, changed, failed = Counter(), 0, 0
+    started = time.monotonic()
+    # spawn: every worker imports torch itself instead of inheriting a forked copy
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(args.workers, mp_context=context, initializer=init_worker,
+                                 initargs=(settings, threads)) as pool:
+            for done, row in enumerate(pool.map(grade_pair, tasks), 1):
+                sink.write(row)
+                if row['error']:
+                    failed += 1
+                    print(f"{row['mango']}: {row['error']}")
+                    continue
+                letters[row['letter']] += 1
+                changed += bool(row['saved_letter']) and row['saved_letter'] != row['letter']
+                if done % 10 == 0 or done == len(tasks):
+                    rate = done / (time.monotonic() - started) * 60
+                    print(f"{done}/{len(tasks)} graded, {rate:.1f} mangoes/min")
+    finally:
+        sink.close()
+    print(f"Grades: {dict(sorted(letters.items()))}, {changed} changed from the saved folder, "
+          f"{failed} failed")
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Accuracy vs latency of the RCNN at smaller input sizes. Every saved capture is
+# measured once at the full frame (reference) and once per size; the table shows
+# the median detector time, the IoU of the top box against the reference and the
+# length/width error in cm. Pick the smallest size whose error you can live with
+# and set it as 'detector_input_size' in grading_engine.py.
+# Run from the project root (needs the checkpoint):
+#   python bench/bench_detector_size.py captured_images/
+#   python bench/bench_detector_size.py captured_images/ --sizes 750 640 480 --limit 50
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def load_frames(folder, limit):
+    from quantize_models import find_images
+    paths = find_images(folder)[:limit] if folder else []
+    if not paths:
+        print("No saved captures found, timing random frames (accuracy columns are meaningless)")
+        return [np.random.randint(0, 256, (1080, 1920, 3), dtype=np.uint8) for _ in range(3)]
+    print(f"Using {len(paths)} captures")
+    return [cv2.cvtColor(cv2.imread(p), cv2.COLOR_BGR2RGB) for p in paths]
+
+def measure(rcnn, frame):
+    # top mango only, the same one GradingEngine.measure keeps
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        results = rcnn.measure_array(frame)
+        elapsed = (time.perf_counter() - start) * 1000
+    best = max(results, key=lambda r: r['confidence']) if results else None
+    return best, elapsed
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    area = lambda box: (box[2] - box[0]) * (box[3] - box[1])
+    union = area(a) + area(b) - inter
+    return inter / union if union > 0 else 0.0
+
+def sweep(rcnn, frames, size, reference=None):
+    rcnn.set_input_size(size)
+    measure(rcnn, frames[0])  # warm-up for this input shape
+    times, results = [], []
+    for frame in frames:
+        best, elapsed = measure(rcnn, frame)
+        times.append(elapsed)
+        results.append(best)
+    row = {'size': size or "full", 'median_ms': statistics.median(times),
+           'iou': None, 'length_err': None, 'width_err': None, 'missed': 0}
+    if reference is not None:
+        ious, length_err, width_err = [], [], []
+        for ref, best in zip(reference, results):
+            if ref is None:
+                continue
+            if best is None:
+                row['missed'] += 1
+                continue
+            ious.append(iou(ref['bounding_box'], best['bounding_box']))
+            length_err.append(abs(ref['length_cm'] - best['length_cm']))
+            width_err.append(abs(ref['width_cm'] - best['width_cm']))
+        if ious:
+            row.update(iou=statistics.mean(ious), length_err=statistics.mean(length_err),
+                       width_err=statistics.mean(width_err))
+    return row, results
+
+def fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", nargs="?", help="session folder with saved captures")
+    parser.add_argument("--rcnn", default="mango_detection_model_more_stop.pth")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[750, 640, 540, 480, 400, 320])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--max-length-error", type=float, default=0.3,
+                        help="cm, used to suggest a default")
+    args = parser.parse_args()
+
+    from rcnn_size import MangoMeasurementSystem
+    with contextlib.redirect_stdout(io.StringIO()):
+        rcnn = MangoMeasurementSystem(args.rcnn)
+    if rcnn.model is None:
+        sys.exit(f"Could not load {args.rcnn}")
+    frames = load_frames(args.folder, args.limit)
+
+    reference_row, reference = sweep(rcnn, frames, None)
+    rows = [reference_row] + [sweep(rcnn, frames, size, reference)[0] for size in args.sizes]
+
+    print(f"{'size':>6} {'median ms':>10} {'iou':>6} {'len err':>8} {'wid err':>8} {'missed':>7}")
+    for row in rows:
+        print(f"{row['size']:>6} {row['median_ms']:>10.0f} {fmt(row['iou'], '.3f'):>6} "
+              f"{fmt(row['length_err'], '.2f'):>8} {fmt(row['width_err'], '.2f'):>8} {row['missed']:>7}")
+
+    ok = [row for row in rows[1:] if row['length_err'] is not None
+          and row['length_err'] <= args.max_length_error and not row['missed']]
+    if ok:
+        best = min(ok, key=lambda row: row['median_ms'])
+        print(f"Fastest size within {args.max_length_error} cm: {best['size']} "
+              f"({best['median_ms']:.0f} ms vs {reference_row['median_ms']:.0f} ms full frame)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Import-time profile of the app entry points, taken from `python -X importtime`.
+# Each module is imported in a fresh interpreter and compared against
+# bench/import_budget.json: a total budget in ms and a list of packages that must
+# only be imported on demand (torch, timm, pandas, ...). Exits 1 on any violation,
+# including a module that fails to import; only a missing package from the
+# module's "optional" list (e.g. customtkinter on a headless box) is skipped.
+# Run from the project root: python bench/bench_import_time.py
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(ROOT, "bench", "import_budget.json")
+
+def profile_import(module):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({'name': name.strip(), 'self_us': int(self_us), 'cumulative_us': int(cumulative_us)})
+    return rows, None
+
+def is_forbidden(name, forbidden):
+    return any(name == package or name.startswith(package + ".") for package in forbidden)
+
+def missing_package(error):
+    # top-level package name from "ModuleNotFoundError: No module named 'x.y'"
+    match = re.match(r"ModuleNotFoundError: No module named '([^'.]+)", error)
+    return match.group(1) if match else None
+
+def check_module(module, budget, runs, top):
+    totals = []
+    for _ in range(runs):
+        rows, error = profile_import(module)
+        if rows is None:
+            if missing_package(error) in budget.get('optional', []):
+                print(f"{module}: SKIP, optional dependency missing ({error})")
+                return True
+            print(f"{module}: FAILED to import ({error})")
+            return False
+        totals.append(next(row['cumulative_us'] for row in reversed(rows) if row['name'] == module) / 1000)
+    total_ms = statistics.median(totals)
+    loaded = sorted({row['name'].split(".")[0] for row in rows if is_forbidden(row['name'], budget['forbidden'])})
+    ok = total_ms <= budget['budget_ms'] and not loaded
+    print(f"{module}: {total_ms:.0f} ms (budget {budget['budget_ms']} ms, median of {runs}) "
+          f"{'OK' if ok else 'OVER BUDGET'}")
+    if loaded:
+        print(f"  imports deferred packages at startup: {', '.join(loaded)}")
+    deps = sorted((row for row in rows if row['name'] != module), key=lambda row: row['cumulative_us'], reverse=True)
+    for row in deps[:top]:
+        print(f"  {row['cumulative_us'] / 1000:8.1f} ms  {row['name']}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the startup import time of the entry points")
+    parser.add_argument("modules", nargs="*", help="Modules to check, default: all in the budget file")
+    parser.add_argument("--budget", default=BUDGET_PATH)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per module")
+    args = parser.parse_args()
+
+    with open(args.budget) as f:
+        budgets = json.load(f)
+    results = [check_module(module, budgets[module], args.runs, args.top)
+               for module in (args.modules or budgets)]
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Cost of the per-call logging on the hot paths: fake GPIO output() in a stepper
+# move, the classifier's class decode and the RCNN result loop. Each case runs with
+# DEBUG on (what the old print() calls did, written to /dev/null so terminal speed
+# does not count) and with the default INFO level, plus the cost of one
+# EVENTS.add(). Needs no checkpoints:
+#   python bench/bench_logging.py
+#   python bench/bench_logging.py --stdout     # write DEBUG to the real terminal
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from event_log import EVENTS, configure_logging
+
+def time_calls(fn, calls, repeats=5):
+    # median microseconds per call
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        runs.append((time.perf_counter() - start) / calls * 1e6)
+    return statistics.median(runs)
+
+def stepper_case():
+    from motor_controller import MotorController
+    mc = MotorController()
+    mc.step_delay = 0
+    def move():
+        # 100 steps out and back, 2 output() calls per step
+        mc.set_stepper_position(100)
+        mc.set_stepper_position(0)
+    return move
+
+def classifier_case():
+    from ai_analyzer import AIAnalyzer
+    ai = AIAnalyzer.__new__(AIAnalyzer)
+    ai.device = torch.device("cpu")
+    ai.multihead = False
+    ai.RIPENESS_SCORES = {'green': 3.0, 'yellow': 1.0, 'yellow_green': 2.0}
+    ai.transform = lambda image: image
+    logits = torch.randn(3)
+    ai.model_ripeness = lambda batch: logits.unsqueeze(0)
+    return lambda: ai.get_predicted_class(logits, True)
+
+def detector_case():
+    from rcnn_size import MangoMeasurementSystem
+    rcnn = MangoMeasurementSystem.__new__(MangoMeasurementSystem)
+    rcnn.class_names = {1: 'bruised', 2: 'not_bruised', 3: 'yellow',
+                        4: 'green_yellow', 5: 'green', 6: 'mango', 7: 'background'}
+    rcnn.reference_box = [815, 383, 999, 556]
+    rcnn.reference_size_cm = 2.4
+    rcnn.model = object()
+    pred = {'boxes': torch.tensor([[100., 100., 900., 700.]] * 3),
+            'scores': torch.tensor([0.9, 0.8, 0.7]), 'labels': torch.tensor([6, 5, 2])}
+    rcnn.detect = lambda image: pred
+    return lambda: rcnn.measure_array(None)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--stdout", action="store_true", help="DEBUG output to the terminal")
+    args = parser.parse_args()
+
+    logger = configure_logging("INFO")
+    stream = sys.stdout if args.stdout else open(os.devnull, "w")
+    logger.handlers[0].setStream(stream)
+    cases = [("stepper move (400 GPIO calls)", stepper_case(), max(1, args.calls // 20)),
+             ("classifier decode", classifier_case(), args.calls),
+             ("RCNN results (3 boxes)", detector_case(), args.calls)]
+
+    rows = []
+    for name, fn, calls in cases:
+        logger.setLevel(logging.DEBUG)
+        debug = time_calls(fn, calls)
+        logger.setLevel(logging.INFO)
+        quiet = time_calls(fn, calls)
+        rows.append((name, debug, quiet))
+    event = time_calls(lambda: EVENTS.add("bench", value=1, letter="A"), args.calls * 10)
+
+    print(f"{'case':32} {'DEBUG us':>10} {'INFO us':>10} {'saved':>7}")
+    for name, debug, quiet in rows:
+        print(f"{name:32} {debug:>10.1f} {quiet:>10.1f} {1 - quiet / debug:>7.0%}")
+    print(f"EVENTS.add: {event:.2f} us per event")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# End-to-end throughput of the headless grading flow with the fake camera and
+# fake GPIO but the real models: capture top and bottom, RCNN, classifiers,
+# grade, sort and save, N times. Reports mangoes/min, per-mango and per-stage
+# latency, peak RSS and CPU use, and compares them with bench/baseline.json.
+# Run from the project root (needs the checkpoints):
+#   python bench/bench_pipeline.py --mangoes 20 --update-baseline   # on a known-good tree
+#   python bench/bench_pipeline.py --mangoes 20                      # exits 1 on a regression
+#   python bench/bench_pipeline.py --no-baseline                     # just report, no comparison
+#   python bench/bench_pipeline.py --auto                            # AutoSortPipeline instead
+#   python bench/bench_pipeline.py --replay 2025-01-01_10-00-00     # saved captures, not noise
+# The baseline is only meaningful on the machine that wrote it; without one the run
+# exits 2 so a check that was never set up does not pass silently.
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_PATH = os.path.join(ROOT, "bench", "baseline.json")
+# (metric, True if higher is better)
+METRICS = [('mangoes_per_minute', True), ('latency_p50_ms', False),
+           ('latency_p95_ms', False), ('peak_rss_mb', False)]
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def grade_loop(engine, img_dir, mangoes):
+    times = []
+    for _ in range(mangoes):
+        start = time.perf_counter()
+        engine.grade_mango(engine.capture(), engine.capture(), img_dir=img_dir)
+        times.append((time.perf_counter() - start) * 1000)
+    return times, mangoes
+
+def auto_run(engine, img_dir, mangoes):
+    # no belt travel and no pacing, so the pipeline runs as fast as inference allows
+    pipeline = engine.create_auto_pipeline(img_dir, {'target_per_minute': 6000.0,
+                                                     'top_time': 0.0, 'bottom_time': 0.0})
+    pipeline.start()
+    while pipeline.is_running() and pipeline.completed < mangoes:
+        time.sleep(0.05)
+    # stopping drops the mangoes still in flight (saved ungraded), they are not counted
+    pipeline.stop()
+    return [], pipeline.completed
+
+def use_fake_hardware():
+    # camera_manager, motor_controller and sorting only fall back to the fakes when
+    # the real packages are missing; on the Pi they would drive the real belt,
+    # sorter and camera, so the fakes are put in their place before those import
+    import types
+    import fake_gpio
+    import fake_picamera2
+    rpi = types.ModuleType("RPi")
+    rpi.GPIO = fake_gpio.GPIO
+    sys.modules['RPi'] = rpi
+    sys.modules['RPi.GPIO'] = fake_gpio.GPIO
+    sys.modules['picamera2'] = fake_picamera2
+
+def run_bench(args):
+    from event_log import configure_logging
+    # the engine sets this too, but only after the controllers have been imported
+    configure_logging("WARNING")
+    use_fake_hardware()
+    from grading_engine import GradingEngine
+    from stage_timer import TIMER
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        engine = GradingEngine({'save_captures': not args.no_save, 'save_annotated': False,
+                                'backend': args.backend, 'log_level': "WARNING",
+                                'replay_dir': args.replay, 'replay_fps': args.replay_fps})
+    if not engine.models_ready.is_set():
+        engine.shutdown()
+        sys.exit(f"Models did not load: {engine.load_errors}")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, \
+            open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # the session folder and captures go to a throwaway directory
+        os.chdir(tmp)
+        try:
+            img_dir = engine.create_session({'ripeness': 3.0, 'bruises': 3.0, 'size': 3.0})
+            grade_loop(engine, img_dir, args.warmup)
+            TIMER.reset()
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            run = auto_run if args.auto else grade_loop
+            times, completed = run(engine, img_dir, args.mangoes)
+            engine.writer.flush()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            stages = TIMER.summary()
+        finally:
+            engine.shutdown()
+            os.chdir(cwd)
+    return {
+        'mangoes': completed,
+        'mode': "auto" if args.auto else "grade_mango",
+        'replay': os.path.basename(os.path.normpath(args.replay)) if args.replay else None,
+        'mangoes_per_minute': completed / wall * 60,
+        'latency_p50_ms': float(np.percentile(times, 50)) if times else None,
+        'latency_p95_ms': float(np.percentile(times, 95)) if times else None,
+        'peak_rss_mb': peak_rss_mb(),
+        # 100% is one core fully busy
+        'cpu_percent': cpu / wall * 100,
+        'stages': {stage: {'p50': row['p50'], 'p95': row['p95'], 'p99': row['p99']}
+                   for stage, row in stages.items()},
+        'machine': {'node': platform.node(), 'machine': platform.machine(),
+                    'cpus': os.cpu_count()},
+    }
+
+def compare(result, baseline, tolerance, min_ms):
+    # returns the names of the metrics that got worse by more than tolerance;
+    # latencies also have to be min_ms worse, sub-millisecond stages are noise
+    regressions = []
+    rows = [(name, higher) for name, higher in METRICS]
+    rows += [(f"stage {stage} p50", False) for stage in result['stages']]
+    print(f"{'metric':28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, higher_is_better in rows:
+        if name.startswith("stage "):
+            stage = name.split()[1]
+            old = baseline.get('stages', {}).get(stage, {}).get('p50')
+            new = result['stages'][stage]['p50']
+        else:
+            old, new = baseline.get(name), result[name]
+        if old is None or new is None or old == 0:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        is_latency = name.startswith("stage ") or name.endswith("_ms")
+        flag = " REGRESSION" if worse > tolerance and not (is_latency and new - old < min_ms) else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:28} {old:>10.1f} {new:>10.1f} {change:>+8.0%}{flag}")
+    return regressions
+
+def print_result(result):
+    print(f"{result['mangoes']} mangoes ({result['mode']}) on {result['machine']['cpus']} CPUs")
+    print(f"  {result['mangoes_per_minute']:.1f} mangoes/min, CPU {result['cpu_percent']:.0f}%, "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB")
+    if result['latency_p50_ms'] is not None:
+        print(f"  per mango p50 {result['latency_p50_ms']:.0f} ms, p95 {result['latency_p95_ms']:.0f} ms")
+    print(f"  {'stage':18} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for stage, row in result['stages'].items():
+        print(f"  {stage:18} {row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless end-to-end grading benchmark")
+    parser.add_argument("--mangoes", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1, help="mangoes graded before timing")
+    parser.add_argument("--auto", action="store_true", help="Run AutoSortPipeline without belt delays")
+    parser.add_argument("--backend", choices=["torch", "torchscript", "onnx"], default="torch")
+    parser.add_argument("--no-save", action="store_true", help="Do not write captures")
+    parser.add_argument("--replay", help="Session folder whose captures the camera replays")
+    parser.add_argument("--replay-fps", type=float, help="Replay frame rate (default: unthrottled)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--no-baseline", action="store_true",
+                        help="Only report, do not compare (or fail) against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression")
+    parser.add_argument("--min-ms", type=float, default=5.0,
+                        help="Smallest latency increase reported as a regression")
+    parser.add_argument("--json", help="Also write this run's result here")
+    args = parser.parse_args()
+
+    result = run_bench(args)
+    print_result(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if args.no_baseline:
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline first "
+              f"(or --no-baseline to only report)")
+        sys.exit(2)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if any(baseline.get(key) != result[key] for key in ('machine', 'mode', 'replay')):
+        print("Baseline was recorded on another machine, mode or replay set, treat the comparison with care")
+    regressions = compare(result, baseline, args.tolerance, args.min_ms)
+    if regressions:
+        print(f"Slower than baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
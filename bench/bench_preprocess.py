@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Compares the PIL Compose transform against the ndarray fast path in preprocess.py
+# Run from the project root: python bench/bench_preprocess.py
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import torch
+from PIL import Image
+import torchvision.transforms as transforms
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocess import ArrayPreprocessor
+
+TF_PARAMS = {'px': 300, 'py': 300,
+             'mean_r': 0.485, 'mean_g': 0.456, 'mean_b': 0.406,
+             'sd_r': 0.229, 'sd_g': 0.224, 'sd_b': 0.225}
+
+def create_compose():
+    return transforms.Compose([
+        transforms.Resize((TF_PARAMS['px'], TF_PARAMS['py'])),
+        transforms.ToTensor(),
+        transforms.Normalize([TF_PARAMS['mean_r'], TF_PARAMS['mean_g'], TF_PARAMS['mean_b']],
+                             [TF_PARAMS['sd_r'], TF_PARAMS['sd_g'], TF_PARAMS['sd_b']])
+    ])
+
+def time_it(fn, runs):
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+def load_frame(path, size):
+    if path:
+        return np.asarray(Image.open(path).convert("RGB"))
+    return np.random.randint(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PIL vs ndarray preprocessing")
+    parser.add_argument("--image", default=None, help="Saved capture to use instead of noise")
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    compose = create_compose()
+    fast = ArrayPreprocessor(TF_PARAMS)
+    frame = load_frame(args.image, (1920, 1080))
+    h, w = frame.shape[:2]
+    # full frame, a centred mango-sized ROI and a small ROI
+    cases = {
+        'full frame': None,
+        'roi 50%': [w // 4, h // 4, w * 3 // 4, h * 3 // 4],
+        'roi 25%': [w * 3 // 8, h * 3 // 8, w * 5 // 8, h * 5 // 8],
+    }
+
+    print(f"Frame: {w}x{h}, runs: {args.runs}, torch threads: {torch.get_num_threads()}")
+    print(f"{'case':12} {'PIL Compose':>12} {'ndarray':>10} {'speedup':>8} {'max diff':>9}")
+    for name, box in cases.items():
+        def pil_path():
+            arr = frame if box is None else frame[box[1]:box[3], box[0]:box[2]]
+            return compose(Image.fromarray(arr).convert("RGB"))
+
+        def fast_path():
+            return fast.to_tensor([frame], [box] if box else None)[0]
+
+        pil_ms = time_it(pil_path, args.runs)
+        fast_ms = time_it(fast_path, args.runs)
+        diff = (pil_path() - fast_path()).abs().max().item()
+        print(f"{name:12} {pil_ms:10.2f}ms {fast_ms:8.2f}ms {pil_ms / fast_ms:7.1f}x {diff:9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Agreement between the classifiers on the whole frame (what they were trained on)
+# and on the padded RCNN crop that 'roi_crop' feeds them. Every saved capture is
+# classified both ways; the table shows how often ripeness and bruises agree and
+# the mean confidence of each. Only turn 'roi_crop' on in grading_engine.py once
+# this agrees well enough, or once the classifiers are retrained on crops.
+# Run from the project root (needs the checkpoints):
+#   python bench/bench_roi_crop.py captured_images/
+#   python bench/bench_roi_crop.py captured_images/ --padding 0.25 --limit 100 --json roi.json
+
+import argparse
+import json
+import os
+import sys
+import cv2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def main():
+    parser = argparse.ArgumentParser(description="Classifier agreement, RCNN crop vs whole frame")
+    parser.add_argument("images", help="Session folder with saved captures")
+    parser.add_argument("--padding", type=float, default=0.15, help="roi_padding to test")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--json", help="Also write the report here")
+    args = parser.parse_args()
+
+    from quantize_models import find_images
+    from grading_engine import GradingEngine
+    paths = find_images(args.images)[:args.limit]
+    if not paths:
+        sys.exit(f"No images found under {args.images}")
+    engine = GradingEngine({'hardware': False, 'save_captures': False, 'save_annotated': False,
+                            'warm_up': False, 'log_level': "WARNING",
+                            'roi_crop': True, 'roi_padding': args.padding})
+    if not engine.models_ready.is_set():
+        sys.exit(f"Models did not load: {engine.load_errors}")
+
+    keys = ('ripeness', 'bruises')
+    agree = {key: 0 for key in keys}
+    confidence = {(key, mode): 0.0 for key in keys for mode in ("full", "crop")}
+    compared, undetected = 0, 0
+    for path in paths:
+        image = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+        results = engine.measure(image, path)
+        box = engine.crop_box(results[0] if results else None, image)
+        if box is None:
+            # no mango found, roi_crop falls back to the whole frame anyway
+            undetected += 1
+            continue
+        full, crop = engine.ai.predict([image, image], [None, box])
+        compared += 1
+        for key in keys:
+            agree[key] += full[key] == crop[key]
+            confidence[(key, "full")] += full[f"{key}_confidence"]
+            confidence[(key, "crop")] += crop[f"{key}_confidence"]
+    engine.writer.close()
+    if not compared:
+        sys.exit("The RCNN found no mango in any capture")
+
+    report = {'images': len(paths), 'compared': compared, 'no_detection': undetected,
+              'padding': args.padding, 'models': {}}
+    print(f"{compared} of {len(paths)} captures compared ({undetected} without a detection), "
+          f"padding {args.padding}")
+    for key in keys:
+        row = {'agreement': agree[key] / compared,
+               'full_confidence': confidence[(key, "full")] / compared,
+               'crop_confidence': confidence[(key, "crop")] / compared}
+        report['models'][key] = row
+        print(f"{key:9} agreement {row['agreement'] * 100:6.2f}%  "
+              f"confidence full {row['full_confidence']:.2f}  crop {row['crop_confidence']:.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.json}")
+
+if __name__ == "__main__":
+    main()
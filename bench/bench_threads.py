@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Sweeps torch intra-/inter-op thread counts and CPU pinning and reports the
+# per-mango latency (both sides through the classifiers plus the RCNN). Each
+# setting runs in its own interpreter because inter-op threads can only be set once.
+# Run from the project root (needs the checkpoints):
+#   python bench/bench_threads.py
+#   python bench/bench_threads.py --threads 1 2 3 4 --interop 1 2 --cpus 1,2,3
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def parse_cpus(text):
+    return [int(cpu) for cpu in text.split(",")] if text else None
+
+def run_worker(args):
+    # one setting: load the models, warm up, then time whole mangoes
+    from runtime_config import apply_torch_threads, pin_current_thread
+    pin_current_thread(parse_cpus(args.worker_cpus))
+    import torch
+    apply_torch_threads({'torch_threads': args.worker_threads, 'interop_threads': args.worker_interop})
+    from ai_analyzer import AIAnalyzer
+    from rcnn_size import MangoMeasurementSystem
+    ai = AIAnalyzer(torch.device("cpu"), {'green': 3.0, 'yellow': 1.0, 'yellow_green': 2.0},
+                    {'bruised': 1.0, 'unbruised': 2.0}, {'small': 1.0, 'medium': 2.0, 'large': 3.0})
+    rcnn = MangoMeasurementSystem(args.rcnn)
+    frame = np.random.randint(0, 256, (1080, 1920, 3), dtype=np.uint8)
+    ai.warm_up(batch_sizes=(2,), runs=2)
+    rcnn.warm_up(runs=2)
+    times = []
+    for _ in range(args.mangoes):
+        start = time.perf_counter()
+        ai.run_models(ai.prepare_batch([frame, frame]))
+        for _ in range(2):
+            rcnn.detect(frame)
+        times.append((time.perf_counter() - start) * 1000)
+    print("RESULT " + json.dumps({'median_ms': statistics.median(times),
+                                  'p90_ms': float(np.percentile(times, 90))}))
+
+def run_setting(threads, interop, cpus, args):
+    command = [sys.executable, os.path.abspath(__file__), "--worker",
+               "--worker-threads", str(threads), "--worker-interop", str(interop),
+               "--mangoes", str(args.mangoes), "--rcnn", args.rcnn]
+    if cpus:
+        command += ["--worker-cpus", cpus]
+    result = subprocess.run(command, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "worker failed")
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep torch threading and CPU pinning")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--interop", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--cpus", nargs="+", default=[""],
+                        help="CPU lists to pin inference to, e.g. 1,2,3 ('' for no pinning)")
+    parser.add_argument("--mangoes", type=int, default=5)
+    parser.add_argument("--rcnn", default="mango_detection_model_more_stop.pth")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-threads", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-interop", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-cpus", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    print(f"{os.cpu_count()} CPUs, {args.mangoes} mangoes per setting")
+    print(f"{'threads':>8}{'interop':>8}{'cpus':>10}{'median ms':>12}{'p90 ms':>10}{'mangoes/min':>13}")
+    for cpus in args.cpus:
+        for threads in args.threads:
+            for interop in args.interop:
+                result = run_setting(threads, interop, cpus, args)
+                if result is None:
+                    continue
+                print(f"{threads:>8}{interop:>8}{cpus or 'all':>10}{result['median_ms']:>12.0f}"
+                      f"{result['p90_ms']:>10.0f}{60000 / result['median_ms']:>13.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,192 @@
-import torch
-from PIL import Image, ImageTk
-import customtkinter as ctk
+import cv2, os, time, threading
+from collections import deque, namedtuple
+from PIL import Image
+from runtime_config import pin_current_thread
+from event_log import get_logger
 try:
     from picamera2 import Picamera2
 except ImportError:
     from fake_picamera2 import Picamera2
 
+log = get_logger("camera_manager")
+
+# timestamp is when the frame's exposure started, on the time.monotonic() clock
+Frame = namedtuple('Frame', ['timestamp', 'lores'])
+
+def exposure_time(request):
+    # libcamera's SensorTimestamp is the start of exposure in ns on CLOCK_BOOTTIME;
+    # moved onto time.monotonic() so it compares with the belt's stop time. A frame
+    # handed over just after the belt stopped may have been exposed while it moved
+    try:
+        sensor_ns = request.get_metadata()['SensorTimestamp']
+    except (KeyError, TypeError, AttributeError):
+        return time.monotonic()
+    if hasattr(time, 'CLOCK_BOOTTIME'):
+        sensor_ns -= time.clock_gettime_ns(time.CLOCK_BOOTTIME) - time.monotonic_ns()
+    return sensor_ns / 1e9
+
 class CameraManager:
-    def __init__(self, resolution={'length': 1920, 'width': 1080}):
+    def __init__(self, resolution={'length': 1920, 'width': 1080},
+                 preview_resolution={'length': 320, 'width': 180},
+                 replay_dir=None, replay_fps=None):
         self.resolution = resolution
-        self.picam2 = Picamera2()
+        self.preview_resolution = preview_resolution
+        # replay_dir (or MANGO_REPLAY_DIR) serves saved captures instead of the
+        # sensor, see replay_picamera2.py
+        replay_dir = replay_dir or os.environ.get("MANGO_REPLAY_DIR")
+        self.replay = bool(replay_dir)
+        if self.replay:
+            from replay_picamera2 import ReplayPicamera2
+            self.picam2 = ReplayPicamera2(replay_dir, fps=replay_fps)
+        else:
+            self.picam2 = Picamera2()
+        self.capture_thread = None
+        self.frames = deque()
+        self.frame_ready = threading.Condition()
+        # (timestamp, request) of the newest frame, kept unreleased so its full
+        # resolution 'main' buffer can still be copied when a side is graded
+        self.held_request = None
+        self.last_preview_timestamp = None
         try :
+            # the small 'lores' stream feeds the live preview, 'main' is only
+            # copied out when a side is graded
             self.camera_config = self.picam2.create_video_configuration(
                 main={"size": (self.resolution['length'],
-                            self.resolution['width'])})
+                            self.resolution['width'])},
+                lores={"size": (self.preview_resolution['length'],
+                                self.preview_resolution['width']),
+                       "format": "YUV420"})
             self.picam2.configure(self.camera_config)
             self.picam2.start()
-            print("Camera initialized successfully")
+            log.info("Camera initialized successfully")
         except Exception as e:
-            print(f"Error intializing camera: {e}")
+            log.error("Error intializing camera: %s", e)
             self.picam2 = None
     
     def get_image(self):
         image = self.picam2.capture_array()
-        image = Image.fromarray(image).convert("RGB")
+        image = self.array_to_image(image)
 
         return image
+
+    def array_to_image(self, arr):
+        return Image.fromarray(arr).convert("RGB")
     
     def capture_array(self):
         arr = self.picam2.capture_array()
 
         return arr
     
-    def set_controller_vars(self, app, video_canvas):
+    def start_capture_thread(self, buffer_size=4, capture_fps=10, cpus=None):
+        # one thread owns the sensor and keeps the last few lores frames for the
+        # preview; only the newest request is held for get_full_frame(), so the
+        # 1920x1080 main stream is never copied unless a side is graded
+        self.frames = deque(maxlen=buffer_size)
+        self.capture_period = 1.0 / capture_fps
+        self.capturing = True
+        self.capture_thread = threading.Thread(target=self.capture_loop, args=(cpus,), daemon=True)
+        self.capture_thread.start()
+
+    def stop_capture_thread(self):
+        if self.capture_thread:
+            self.capturing = False
+            self.capture_thread.join()
+            self.capture_thread = None
+        with self.frame_ready:
+            held, self.held_request = self.held_request, None
+        if held:
+            held[1].release()
+
+    def capture_loop(self, cpus=None):
+        pin_current_thread(cpus)
+        while self.capturing:
+            started = time.monotonic()
+            try:
+                request = self.picam2.capture_request()
+                try:
+                    frame = Frame(exposure_time(request), request.make_array("lores"))
+                except Exception:
+                    request.release()
+                    raise
+            except Exception as e:
+                log.error("Error capturing frame: %s", e)
+                time.sleep(self.capture_period)
+                continue
+            with self.frame_ready:
+                # main of the held request is the same frame as its lores
+                held, self.held_request = self.held_request, (frame.timestamp, request)
+                self.frames.append(frame)
+                self.frame_ready.notify_all()
+            if held:
+                held[1].release()
+            remaining = self.capture_period - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def get_latest_frame(self):
+        with self.frame_ready:
+            return self.frames[-1] if self.frames else None
+
+    def get_frame_after(self, timestamp, timeout=1.0):
+        # oldest buffered frame newer than timestamp, waiting for one if needed
+        with self.frame_ready:
+            found = self.frame_ready.wait_for(
+                lambda: self.frames and self.frames[-1].timestamp > timestamp, timeout)
+            if not found:
+                return None
+            return next(frame for frame in self.frames if frame.timestamp > timestamp)
+
+    def get_full_frame(self, after=None, timeout=1.0):
+        # full resolution copy of the newest frame (exposed after `after` if given),
+        # out of the held request when the capture thread is running. Replayed
+        # captures are taken in order instead, so runs are reproducible
+        if self.capture_thread and not self.replay:
+            with self.frame_ready:
+                found = self.frame_ready.wait_for(
+                    lambda: self.held_request and (after is None or self.held_request[0] > after),
+                    timeout)
+                if found:
+                    # under the lock, so the capture thread cannot release it meanwhile
+                    return self.held_request[1].make_array("main")
+        return self.capture_array()
+
+    def get_preview_image(self):
+        if self.capture_thread:
+            frame = self.get_latest_frame()
+            if frame is None or frame.timestamp == self.last_preview_timestamp:
+                return None
+            self.last_preview_timestamp = frame.timestamp
+            yuv = frame.lores
+        else:
+            yuv = self.picam2.capture_array("lores")
+        # lores has to be YUV420 on the Pi 4 and earlier
+        rgb = cv2.cvtColor(yuv, cv2.COLOR_YUV420p2RGB)
+        return Image.fromarray(rgb)
+
+    def set_controller_vars(self, app, video_canvas, on_first_frame=None):
         self.app = app
         self.video_canvas = video_canvas
+        # called once, after the first preview frame is drawn
+        self.on_first_frame = on_first_frame
 
     def get_video_feed(self):
+        # Tk is only needed for the GUI preview, the headless engine never calls this
+        from PIL import ImageTk
+        import customtkinter as ctk
         vid_params = {'f_length':300, 'f_width':200, 'buffer':10, 'x':0, 'y':0}
-        frame = self.get_image()
-        frame = frame.resize((vid_params['f_length'], vid_params['f_width']))
-        frame = ImageTk.PhotoImage(frame)
-        self.video_canvas.create_image(vid_params['x'], vid_params['y'], anchor=ctk.NW, image=frame)
-        self.video_canvas.image = frame
+        frame = self.get_preview_image()
+        # None means no new frame since the last redraw
+        if frame is not None:
+            frame = frame.resize((vid_params['f_length'], vid_params['f_width']))
+            frame = ImageTk.PhotoImage(frame)
+            self.video_canvas.create_image(vid_params['x'], vid_params['y'], anchor=ctk.NW, image=frame)
+            self.video_canvas.image = frame
+            if self.on_first_frame:
+                self.on_first_frame()
+                self.on_first_frame = None
         self.app.after(vid_params['buffer'], self.get_video_feed)
 
    
     def stop_camera(self):
+        self.stop_capture_thread()
         self.picam2.stop()
@@ -1,15 +1,16 @@
-import torch, time, sys, os, threading, json, shutil
+import time, sys, threading
+# time-to-first-frame and time-to-ready are measured from here
+STARTED = time.monotonic()
 import help_module
 from datetime import datetime
 import customtkinter as ctk
 from PIL import Image, ImageTk
-from get_size import calculate_size, determine_size, load_json_file
-from motor_controller import MotorController
-from ai_analyzer import AIAnalyzer
-from camera_manager import CameraManager
-from formula_controller import FormulaController
-from rcnn_size import MangoMeasurementSystem
-from sorting import SorterController
+from get_size import load_json_file
+from grading_engine import GradingEngine
+from grading_worker import GradingWorker, GradingCancelled
+from runtime_config import pin_current_thread
+from event_log import EVENTS
+from stage_timer import TIMER
     
 class ConveyorControllerV2:
     def __init__(self, app, data):
@@ -27,9 +28,6 @@ class ConveyorControllerV2:
         self.TITLE_FONT_SIZE = 20
         self.TITLE_FONT = ctk.CTkFont(family=ctk.ThemeManager.theme["CTkFont"]["family"],
                                       size=self.TITLE_FONT_SIZE,weight="bold")
-        self.RIPENESS_SCORES = {'green': 3.0, 'yellow': 1.0, 'yellow_green': 2.0}       
-        self.BRUISES_SCORES = {'bruised': 1.0, 'unbruised': 2.0}
-        self.SIZE_SCORES = {'small': 1.0, 'medium': 2.0, 'large': 3.0}
         self.recorded_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         self.top_final_score = 0
         self.bottom_final_score = 0
@@ -38,20 +36,33 @@ class ConveyorControllerV2:
         self.BUTTON_WIDTH = 180
         self.BUTTON_HEIGHT = 40
         self.img_dir = ""
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.ai = AIAnalyzer(self.device, self.RIPENESS_SCORES, self.BRUISES_SCORES, self.SIZE_SCORES)
-        self.mc = MotorController()
-        self.mc.setup_gpio()
-        self.picam2 = CameraManager()
-        self.formula = FormulaController(self.RIPENESS_SCORES, self.BRUISES_SCORES, self.SIZE_SCORES)
-        self.sort = SorterController()
-        self.sort.setup_gpio()
-        # mango_detection_model 
-        # mango_detection_model_stopper 
-        # mango_detection_model_more_stop 
-        RCNN_PATH = "mango_detection_model_more_stop.pth"
-        self.rcnn_size = MangoMeasurementSystem(RCNN_PATH)
+        # mangoes captured but not fully graded yet, keyed by recorded_time
+        self.mangoes = {}
+        self.current_mango = None
+        # models, camera, motors and sorter live in the headless engine,
+        # this class only drives it from the Tk widgets
+        # models load on background threads after the window is up, see on_model_loaded
+        self.engine = GradingEngine(load_models=False)
+        self.time_to_ready = None
+        self.picam2 = self.engine.camera
+        self.mc = self.engine.mc
+        self.formula = self.engine.formula
+        self.sort = self.engine.sort
+        # keep the Tk thread off the inference cores (runtime_config.json)
+        pin_current_thread(self.engine.runtime['ui_cpus'])
+        # capture, inference and grading run off the Tk thread
+        self.grader = GradingWorker(self.app, self.grade_side,
+                                    cpus=self.engine.runtime['inference_cpus'])
+        self.auto = None
+        self.stage_overlay = None
+        self.stage_overlay_job = None
         self.init_ui()
+        # F2 shows p50/p95/p99 per stage over the window, F3 writes them to the session
+        self.app.bind("<F2>", lambda event: self.toggle_stage_overlay())
+        self.app.bind("<F3>", lambda event: self.engine.dump_stage_times())
+        self.set_progress(0.0, self.names["control"]["status_loading"])
+        self.engine.start_loading(
+            on_loaded=lambda name, error: self.app.after(0, lambda: self.on_model_loaded(name, error)))
     
     def init_ui(self):
         INIT_WEIGHT=1
@@ -67,7 +78,8 @@ class ConveyorControllerV2:
         self.init_user_priority_frame(self.main_frame)
         self.init_control_frame(self.main_frame)
         self.init_video_frame(self.view_frame)
-        self.picam2.set_controller_vars(self.app, self.video_canvas)
+        self.picam2.set_controller_vars(self.app, self.video_canvas,
+                                        on_first_frame=self.on_first_frame)
         self.picam2.get_video_feed()
         
 
@@ -197,6 +209,40 @@ class ConveyorControllerV2:
         col_index += 1
         self.button_side2.grid(row=row_index, column=col_index, padx= txt["padx"],
                                pady=txt["pady"], sticky="nswe")
+
+        row_index += 1
+        col_index = 0
+        self.progress_bar = ctk.CTkProgressBar(left_frame, width=self.BUTTON_WIDTH * 2 + 40)
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=row_index, column=col_index, columnspan=2,
+                               padx=txt["padx"], pady=txt["pady"], sticky="we")
+
+        row_index += 1
+        self.progress_label = ctk.CTkLabel(left_frame, text=txt["status_idle"],
+                                           text_color=self.colors["text_color"])
+        self.progress_label.grid(row=row_index, column=col_index, padx=txt["padx"],
+                                 pady=txt["pady"], sticky="w")
+        col_index += 1
+        self.button_cancel = ctk.CTkButton(left_frame, text=txt["button_cancel"],
+                                           width=self.BUTTON_WIDTH, height=self.BUTTON_HEIGHT,
+                                           fg_color=self.colors["bg_red"],
+                                           hover_color=self.colors["hover_red"],
+                                           state="disabled", font=self.DEFAULT_BOLD)
+        self.button_cancel.configure(command=self.cancel_grading)
+        self.button_cancel.grid(row=row_index, column=col_index, padx=txt["padx"],
+                                pady=txt["pady"], sticky="nswe")
+
+        row_index += 1
+        col_index = 0
+        self.button_auto = ctk.CTkButton(left_frame, text=txt["button_auto"],
+                                         width=self.BUTTON_WIDTH * 2 + 40,
+                                         height=self.BUTTON_HEIGHT,
+                                         fg_color=self.colors["green"],
+                                         hover_color=self.colors["green_hover"],
+                                         state="disabled", font=self.DEFAULT_BOLD)
+        self.button_auto.configure(command=self.toggle_auto_mode)
+        self.button_auto.grid(row=row_index, column=col_index, columnspan=2,
+                              padx=txt["padx"], pady=txt["pady"], sticky="nswe")
     
     def init_video_frame(self, frame):
         row_index=0
@@ -419,22 +465,33 @@ class ConveyorControllerV2:
         y = parent.winfo_y() + (parent.winfo_height() // 2) - (popup.winfo_height() // 2)
         popup.geometry(f"+{x}+{y}")
 
+    def on_first_frame(self):
+        print(f"Time to first frame: {time.monotonic() - STARTED:.2f}s")
+
+    def on_model_loaded(self, name, error):
+        if error:
+            self.set_progress(0.0, f"Failed to load {name} model")
+            return
+        if name != 'ready':
+            loaded = len(self.engine.load_times) / (len(self.engine.loaders) + 1)
+            if len(self.engine.load_times) < len(self.engine.loaders):
+                self.set_progress(loaded, f"Loaded {name} model...")
+            else:
+                self.set_progress(loaded, self.names["control"]["status_warm_up"])
+            return
+        self.time_to_ready = time.monotonic() - STARTED
+        print(f"Time to ready: {self.time_to_ready:.2f}s")
+        self.set_progress(1.0, self.names["control"]["status_ready"])
+        if self.check_priority and not self.priority_enabled:
+            # priorities were entered while loading
+            self.button_side1.configure(state="normal")
+            self.button_auto.configure(state="normal")
+
     def enter_priority(self, combo_boxes):
         [all_valid, error_log] = self.formula.is_valid_priority(combo_boxes)
         if all_valid:
             if not self.priority_enabled:
-                txt = self.names["priority"]["default_val"]
-                for combo in [self.ripeness_combo, self.bruises_combo, self.size_combo]:
-                    combo.configure(state="normal")
-                    combo.set(txt)
-                self.button_enter.configure(text="Enter")
-                for button in [self.button_side1, self.button_side2,
-                               self.button_cwc1, self.button_ccwc1,
-                               self.button_cwc2, self.button_ccwc2,
-                               self.button_run]:
-                    button.configure(state="disabled")
-                self.priority_enabled = True
-                self.sort.stop_motors()
+                self.end_session()
             else: # All sucessful input is true
                 for combo in [self.ripeness_combo, self.bruises_combo, self.size_combo]:
                     combo.configure(state="disabled")
@@ -443,28 +500,32 @@ class ConveyorControllerV2:
                     fg_color=self.colors["bg_red"],
                     hover_color=self.colors["hover_red"]
                 )
-                self.formula.set_input_priority(self.get_input_priorities())
                 self.priority_enabled = False
                 is_bool = self.check_priority_input()
                 self.check_priority = is_bool
-                self.img_dir = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-                os.makedirs(self.img_dir, exist_ok=True)
-                # Create subdirectories for Grade-A, Grade-B, and Grade-C inside it
-                for grade in ["Grade-A", "Grade-B", "Grade-C"]:
-                    os.makedirs(os.path.join(self.img_dir, grade), exist_ok=True)
-                # === Save input priorities to a text file ===
-                priorities = self.get_input_priorities()
-                txt_path = os.path.join(self.img_dir, "input_priorities.txt")
-                with open(txt_path, "w") as f:
-                    for key, val in priorities.items():
-                        f.write(f"{key}: {val}\n")
-                print(f"Created directories under {self.img_dir}")
-                print(f"Saved priorities to {txt_path}")
+                self.img_dir = self.engine.create_session(self.get_input_priorities())
         else:
             top_parent = self.button_run.winfo_toplevel()
             self.set_error_pop_up(top_parent, self.errors[error_log]["title"],
                                           self.errors[error_log]["message"])
         
+    def end_session(self):
+        txt = self.names["priority"]["default_val"]
+        for combo in [self.ripeness_combo, self.bruises_combo, self.size_combo]:
+            combo.configure(state="normal")
+            combo.set(txt)
+        self.button_enter.configure(text="Enter")
+        self.stop_auto_mode()
+        for button in [self.button_side1, self.button_side2,
+                       self.button_cwc1, self.button_ccwc1,
+                       self.button_cwc2, self.button_ccwc2,
+                       self.button_run, self.button_auto]:
+            button.configure(state="disabled")
+        self.priority_enabled = True
+        self.grader.cancel_all()
+        self.save_pending_captures()
+        self.sort.stop_motors()
+
     def help_popup(self):
         help_page = help_module.Help(self.app)
         help_page.grab_set()
@@ -472,50 +533,70 @@ class ConveyorControllerV2:
     def stop_sorting(self):
         self.sort.stop_motors()
 
+    def save_pending_captures(self):
+        # mangoes that never got both sides graded are kept ungraded in img_dir
+        for mango in self.mangoes.values():
+            self.save_mango_captures(mango, self.img_dir)
+        self.mangoes = {}
+
+    def shutdown_workers(self):
+        if self.auto:
+            self.auto.stop()
+        self.grader.stop()
+        self.save_pending_captures()
+        self.engine.shutdown()
+
     def reset_program(self):
+        # resets in place: the loaded models, camera and worker threads are reused
+        started = time.monotonic()
         print("Resetting")
-        self.sort.stop_motors()
-        self.sort.clean_gpio()
-        self.mc.clean_gpio()
-        self.picam2.stop_camera()
-        os.execv(sys.executable, [sys.executable] + sys.argv)
+        self.end_session()
+        self.mc.stop_motors()
+        self.check_priority = False
+        self.img_dir = ""
+        self.recorded_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.top_final_score = 0
+        self.bottom_final_score = 0
+        self.current_mango = None
+        self.button_enter.configure(state="normal", fg_color=self.colors["green"],
+                                    hover_color=self.colors["green_hover"])
+        for button in [self.button_cwc1, self.button_ccwc1, self.button_cwc2, self.button_ccwc2]:
+            button.configure(fg_color=self.colors["default_button"],
+                             hover_color=self.colors["button_hover_blue"])
+        self.textbox.configure(state="normal")
+        self.textbox.set(self.names["control"]["default_val"])
+        vid_txt = self.names["video"]
+        self.results_data.configure(text=vid_txt["final_results"])
+        self.side1_results.configure(text=vid_txt["side_results"])
+        self.side2_results.configure(text=vid_txt["side_results"])
+        for box in [self.side1_box, self.side2_box]:
+            box.delete("all")
+            box.image = None
+        status = "status_ready" if self.engine.models_ready.is_set() else "status_loading"
+        self.set_progress(0.0, self.names["control"][status])
+        self.button_cancel.configure(state="disabled")
+        print(f"Reset done in {(time.monotonic() - started) * 1000:.0f} ms")
 
     def exit_program(self):
         print("Goodbye")
-        self.sort.stop_motors()
-        self.sort.clean_gpio()
-        self.mc.clean_gpio()
-        self.picam2.stop_camera()
+        self.shutdown_workers()
         sys.exit(0)
         return priorities
 
-    def process_mango_image(self, img_path):
-        results = self.rcnn_size.get_size(img_path)
-        
-        if not results:
-            print("No mangoes detected")
-            length = 0
-            width = 0
-            print(f"Processing Mango: No detection")
-            print(f"  Dimensions: {length} x {width} cm")
-            return length, width
-        else:
-            most_confident = max(results, key=lambda x: x['confidence'])
-            length = most_confident['length_cm']
-            width = most_confident['width_cm']
-            return length, width
-        
     def check_priority_input(self):
         if (self.priority_enabled == False):
             txt = self.names["control"]
 
+            # capture and auto mode wait for the models, see on_model_loaded
+            grading_state = "normal" if self.engine.models_ready.is_set() else "disabled"
             button_configs = {
                 self.button_run: "normal",
-                self.button_side1: "normal", 
+                self.button_side1: grading_state,
                 self.button_cwc1: "normal",
                 self.button_cwc2: "normal",
                 self.button_ccwc1: "normal",
-                self.button_ccwc2: "normal"
+                self.button_ccwc2: "normal",
+                self.button_auto: grading_state
             }
 
             for button, state in button_configs.items():
@@ -541,134 +622,188 @@ class ConveyorControllerV2:
             self.sort.stop_motors()
             self.button_enter.configure(state="disabled")
             self.recorded_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            if self.recorded_time in self.mangoes:
+                # previous mango from the same second is still being graded
+                self.recorded_time += f"_{len(self.mangoes)}"
             print("Process and pictured side 1")
-            s1 = self.ai.get_is_s1()
-            t_img = self.picam2.get_image()
-            filename = os.path.join(self.img_dir, f"{self.recorded_time}_top.png")
-            t_img.save(filename)
-            f_dt = self.recorded_time
-            t_r = self.ai.get_predicted_class(t_img, self.ai.get_is_ripeness())
-            t_b = self.ai.get_predicted_class(t_img, self.ai.get_is_bruises())
-            path_img = os.path.join(self.img_dir, f"{f_dt}_top.png")
-            # imgs = {'m': f"{f_dt}_top.png", 
-            #         'f_dt': f_dt}
-            imgs = {'m': path_img, 'f_dt': f_dt}
-            # t_x, t_y = calculate_size(imgs, s1)
-            print("\n\nRCNN")
-            x, y = self.process_mango_image(imgs['m'])
-            rcnn_size = {'length_cm': x, 'width_cm': y}
-            print("\n\n")
-            # print(f"Top Width: {t_x:.2f} cm, Top Length: {t_y:.2f} cm")
-            t_s = determine_size(rcnn_size['length_cm'], rcnn_size['width_cm']) 
-            print("RCNN")
-            print(f"Length: {rcnn_size['length_cm']:.2f} cm, Width: {rcnn_size['width_cm']:.2f} cm")
-            priorities = self.formula.get_priorities()
-            ai_pred = {'ripeness': t_r,
-                    'bruises': t_b,
-                    'size': t_s}
-            num_grade = self.ai.get_overall_grade(ai_pred, priorities)
-            self.top_final_score=num_grade
-            letter_grade = self.formula.get_grade_letter(num_grade)
-            results_data = {'img': t_img,
-                            'num_grade': num_grade,
-                            'letter_grade': letter_grade}
-            self.set_textbox_results(results_data, ai_pred, s1)
+            pressed = time.perf_counter()
+            with TIMER.span("capture"):
+                t_arr = self.picam2.get_full_frame()
+            self.current_mango = {'recorded_time': self.recorded_time, 'scores': {}, 'images': {}}
+            self.mangoes[self.recorded_time] = self.current_mango
+            self.submit_side(self.current_mango, 'top', t_arr, pressed)
+            # side 2 can be captured while side 1 is still being analyzed
             self.button_side1.configure(state="disabled")
             self.button_side2.configure(state="normal")
 
     def picture_side2(self):
         print("Process and pictured side 2")
-        s2 = self.ai.get_is_s2()
-        b_img = self.picam2.get_image()
-        filename = os.path.join(self.img_dir, f"{self.recorded_time}_bottom.png")
-        b_img.save(filename)
-        f_dt = self.recorded_time
-        b_r = self.ai.get_predicted_class(b_img, self.ai.get_is_ripeness())
-        b_b = self.ai.get_predicted_class(b_img, self.ai.get_is_bruises())
-        path_img = os.path.join(self.img_dir, f"{f_dt}_bottom.png")
-        # imgs = {'m': f"{f_dt}_top.png", 
-        #         'f_dt': f_dt}
-        imgs = {'m': path_img, 'f_dt': f_dt}
-        # imgs = {'m': f"{f_dt}_bottom.png", 
-        #         'f_dt': f_dt}
-        # b_x, b_y = calculate_size(imgs, s2)
-        print("\n\nRCNN")
-        x, y = self.process_mango_image(imgs['m'])
-        rcnn_size = {'length_cm': x, 'width_cm': y}
-        print("\n\n")
-        # print(f"Bottom Width: {b_x:.2f} cm, Bottom Length: {b_y:.2f} cm")        
-        b_s = determine_size(rcnn_size['length_cm'], rcnn_size['width_cm']) 
-        print("RCNN")
-        print(f"Length: {rcnn_size['length_cm']:.2f} cm, Width: {rcnn_size['width_cm']:.2f} cm")
-        priorities = self.formula.get_priorities()
-        ai_pred = {'ripeness': b_r,
-                   'bruises': b_b,
-                   'size': b_s}
-        num_grade = self.ai.get_overall_grade(ai_pred, priorities)
-        self.bottom_final_score=num_grade
-        letter_grade = self.formula.get_grade_letter(num_grade)
-        results_data = {'img': b_img,
-                        'num_grade': num_grade,
-                        'letter_grade': letter_grade}
-        self.set_textbox_results(results_data, ai_pred, s2)
-        
-        ave_score = (self.top_final_score + self.bottom_final_score) / 2
+        pressed = time.perf_counter()
+        with TIMER.span("capture"):
+            b_arr = self.picam2.get_full_frame()
+        self.submit_side(self.current_mango, 'bottom', b_arr, pressed)
+        self.button_side2.configure(state="disabled")
+        self.button_side1.configure(state="normal")
+
+    def submit_side(self, mango, side, image, pressed=None):
+        if self.engine.settings['save_captures']:
+            # written once both sides are graded and the grade folder is known
+            mango['images'][side] = image
+        payload = {'side': side, 'image': image,
+                   'recorded_time': mango['recorded_time'],
+                   'img_dir': self.img_dir,
+                   'priorities': self.formula.get_priorities(),
+                   'pressed': pressed}
+        self.grader.submit(payload,
+                           on_result=lambda result: self.on_side_graded(mango, result),
+                           on_progress=self.set_progress,
+                           on_error=lambda error: self.on_grading_error(mango, error))
+        self.button_cancel.configure(state="normal")
+        self.set_progress(0.0, f"Queued {side} side of {mango['recorded_time']}")
+
+    def grade_side(self, job, report_progress):
+        # runs on the grading worker thread, must not touch any widget
+        payload = job.payload
+        side = payload['side']
+        image = payload['image']
+        def progress(fraction, stage):
+            # between the engine's steps, so Cancel stops before the next one
+            job.check_cancelled()
+            report_progress(fraction, f"{stage} {side} side...")
+        result = self.engine.grade_side(image, side, payload['recorded_time'],
+                                        payload['img_dir'], payload['priorities'], progress)
+        job.check_cancelled()
+        # shrink for the side canvas here instead of on the Tk thread
+        result['img'] = self.picam2.array_to_image(image).resize((300, 200))
+        result['pressed'] = payload['pressed']
+        return result
+
+    def on_side_graded(self, mango, result):
+        is_top = result['side'] == 'top'
+        mango['scores'][result['side']] = result['num_grade']
+        if is_top:
+            self.top_final_score = result['num_grade']
+        else:
+            self.bottom_final_score = result['num_grade']
+        self.set_textbox_results(result, result['ai_pred'], is_top, result['pressed'])
+        if len(mango['scores']) == 2:
+            self.finish_mango(mango)
+        self.update_grading_idle()
+
+    def on_grading_error(self, mango, error):
+        # cancelled or failed: keep the captures ungraded in the session folder
+        if mango['recorded_time'] in self.mangoes:
+            self.save_mango_captures(self.mangoes.pop(mango['recorded_time']), self.img_dir)
+        if mango is self.current_mango:
+            self.button_side1.configure(state="normal")
+            self.button_side2.configure(state="disabled")
+        message = "Grading cancelled" if isinstance(error, GradingCancelled) else f"Grading failed: {error}"
+        self.set_progress(0.0, message)
+        self.update_grading_idle()
+
+    def cancel_grading(self):
+        self.grader.cancel_all()
+
+    def set_progress(self, progress, message):
+        self.progress_bar.set(progress)
+        self.progress_label.configure(text=message)
+
+    def update_grading_idle(self):
+        if not self.grader.is_busy():
+            self.button_cancel.configure(state="disabled")
+            if self.button_side2.cget("state") == "disabled":
+                self.button_enter.configure(state="normal")
+
+    def finish_mango(self, mango):
+        self.mangoes.pop(mango['recorded_time'], None)
+        top_score = mango['scores']['top']
+        bottom_score = mango['scores']['bottom']
+        ave_score = (top_score + bottom_score) / 2
         ave_letter = self.formula.get_grade_letter(ave_score)
+        self.set_final_results(top_score, bottom_score, ave_score, ave_letter)
+        EVENTS.add("grade", recorded_time=mango['recorded_time'], letter=ave_letter,
+                   ave_score=ave_score, top_score=top_score, bottom_score=bottom_score)
+        self.set_progress(1.0, f"{mango['recorded_time']}: Grade {ave_letter}")
+
+        # === Write BOTH images into Grade-{ave_letter} folder ===
+        self.save_mango_captures(mango, self.engine.grade_folder(self.img_dir, ave_letter))
+        self.engine.sort_mango(ave_letter)
+
+    def set_final_results(self, top_score, bottom_score, ave_score, ave_letter):
         grade_info = self.formula.get_grade_formula_dict()
         grade_string = "\n".join([f"Grade {grade}: {info}" for grade, info in grade_info.items()])
         print(grade_string)
         self.results_data.configure(
-            text=(f"Side 1 Score: {self.top_final_score:.2f}\n" +
-                f"Side 2 Score: {self.bottom_final_score:.2f}\n" +
+            text=(f"Side 1 Score: {top_score:.2f}\n" +
+                f"Side 2 Score: {bottom_score:.2f}\n" +
                 grade_string + f"\n" +
                 f"Average Score: {ave_score:.2f}\n" + 
                 f"Predicted Grade: {ave_letter}"))
-        
-        button_configs = {
-            self.button_side1: "normal",
-            self.button_side2: "disabled", 
-            self.button_enter: "normal"
-        }
-        for button, state in button_configs.items():
-            button.configure(state=state)
-
-        # === Move BOTH images into Grade-{ave_letter} folder ===
-        grade_folder = os.path.join(self.img_dir, f"Grade-{ave_letter.upper()}")
-        os.makedirs(grade_folder, exist_ok=True)
-
-        top_src = os.path.join(self.img_dir, f"{self.recorded_time}_top.png")
-        bottom_src = os.path.join(self.img_dir, f"{self.recorded_time}_bottom.png")
-        top_dst = os.path.join(grade_folder, f"{self.recorded_time}_top.png")
-        bottom_dst = os.path.join(grade_folder, f"{self.recorded_time}_bottom.png")
-
-        if os.path.exists(top_src):
-            shutil.move(top_src, top_dst)
-            print(f"Moved TOP image to: {top_dst}")
-
-        if os.path.exists(bottom_src):
-            shutil.move(bottom_src, bottom_dst)
-            print(f"Moved BOTTOM image to: {bottom_dst}")
-
-        # TODO: add the sorting.py
-        # pseudocode
-        # if ave_letter is a
-        #   then move motor3 and motor4 to cw or ccw
-        # else ave_letter is b
-        #   then move motor3 and motor4 to cw or ccw#
-        # else ave_letter is c
-        #   then move motor3 and motor4 to cw or ccw      
-        if ave_letter.upper()  == 'A':
-            button_state_array = [0, 1, 0, 0]
-            print(button_state_array)
-            self.sort.set_motors(button_state_array)
-        elif ave_letter.upper() == 'B':
-            button_state_array = [1, 0, 1, 0]
-            print(button_state_array)
-            self.sort.set_motors(button_state_array)
-        elif ave_letter.upper() == 'C':
-            button_state_array = [1, 0, 0, 1]
-            print(button_state_array)
-            self.sort.set_motors(button_state_array)
+
+    def toggle_auto_mode(self):
+        if self.auto and self.auto.is_running():
+            self.stop_auto_mode()
+            return
+        if not self.check_priority:
+            return
+        if self.grader.is_busy():
+            # the manual captures still being graded come first
+            self.set_progress(self.progress_bar.get(), "Wait for the manual grading to finish")
+            return
+        self.auto = self.engine.create_auto_pipeline(self.img_dir, on_result=self.on_auto_result)
+        for button in [self.button_side1, self.button_side2, self.button_run,
+                       self.button_cwc1, self.button_ccwc1,
+                       self.button_cwc2, self.button_ccwc2, self.button_enter]:
+            button.configure(state="disabled")
+        self.button_auto.configure(text=self.names["control"]["button_auto_stop"],
+                                   fg_color=self.colors["bg_red"],
+                                   hover_color=self.colors["hover_red"])
+        self.auto.start()
+        self.set_progress(0.0, "Auto mode: waiting for the first mango")
+
+    def stop_auto_mode(self):
+        if not (self.auto and self.auto.is_running()):
+            return
+        # the stages finish their current mango in the background, the UI goes on
+        self.auto.stop(wait=False)
+        self.sort.stop_motors()
+        stats = self.auto.get_stats()
+        self.set_progress(0.0, f"Auto mode stopped: {stats['completed']} mangoes, "
+                               f"{stats['per_minute']:.1f}/min")
+        for button in [self.button_side1, self.button_run,
+                       self.button_cwc1, self.button_ccwc1,
+                       self.button_cwc2, self.button_ccwc2, self.button_enter]:
+            button.configure(state="normal")
+        self.button_side2.configure(state="disabled")
+        self.button_auto.configure(text=self.names["control"]["button_auto"],
+                                   fg_color=self.colors["green"],
+                                   hover_color=self.colors["green_hover"])
+
+    def on_auto_result(self, mango, stats):
+        # runs on the auto mode sort thread: build the previews here, then hand
+        # only the widget updates to the Tk loop
+        images = mango['images']
+        side_results = []
+        for side, is_top in (('top', True), ('bottom', False)):
+            preview = self.picam2.array_to_image(images[side]).resize((300, 200))
+            side_results.append(({'img': preview, 'num_grade': mango[f'{side}_score'],
+                                  'letter_grade': mango[f'{side}_letter']},
+                                 mango[f'{side}_pred'], is_top))
+        def update():
+            self.top_final_score = mango['top_score']
+            self.bottom_final_score = mango['bottom_score']
+            for result in side_results:
+                self.set_textbox_results(*result)
+            self.set_final_results(mango['top_score'], mango['bottom_score'],
+                                   mango['ave_score'], mango['letter'])
+            self.set_progress(min(1.0, stats['per_minute'] / stats['target_per_minute']),
+                              f"Auto: {stats['completed']} mangoes, "
+                              f"{stats['per_minute']:.1f}/{stats['target_per_minute']} per min")
+        self.app.after(0, update)
+
+    def save_mango_captures(self, mango, folder):
+        self.engine.save_captures(mango['recorded_time'], mango['images'], folder)
+        mango['images'] = {}
      
     def get_input_priorities(self):
         arr = {
@@ -677,14 +812,14 @@ class ConveyorControllerV2:
             'size': float(self.size_combo.get())}
         return arr
     
-    def set_textbox_results(self, results_data, ai_pred, is_top):
+    def set_textbox_results(self, results_data, ai_pred, is_top, pressed=None):
         image = results_data['img']
         ripeness = ai_pred['ripeness']
         bruises = ai_pred['bruises']
         size = ai_pred['size']
         score = results_data['num_grade']
         letter = results_data['letter_grade']
-        def update():
+        def show():
             if is_top:
                 self.side1_results.configure(
                     text=f"Ripeness: {ripeness}\nBruises: {bruises}\nSize: {size}\nScore: {letter} or {score} ")
@@ -696,8 +831,31 @@ class ConveyorControllerV2:
                 bottom_photo = ImageTk.PhotoImage(image.resize((300, 200)))
                 self.side2_box.create_image(0, 0, anchor=ctk.NW, image=bottom_photo)
                 self.side2_box.image = bottom_photo  
+        def update():
+            with TIMER.span("ui_update"):
+                show()
+            if pressed is not None:
+                # button press to this side's result on screen
+                TIMER.record("capture_to_result", (time.perf_counter() - pressed) * 1000)
         self.app.after(0, update)
 
+    def toggle_stage_overlay(self):
+        if self.stage_overlay is not None:
+            self.app.after_cancel(self.stage_overlay_job)
+            self.stage_overlay.destroy()
+            self.stage_overlay = None
+            return
+        self.stage_overlay = ctk.CTkLabel(self.app, text="", justify="left", anchor="nw",
+                                          font=ctk.CTkFont(family="Courier", size=12),
+                                          fg_color=self.colors["text_background"],
+                                          text_color=self.colors["text_color"])
+        self.stage_overlay.place(relx=1.0, rely=0.0, anchor="ne")
+        self.refresh_stage_overlay()
+
+    def refresh_stage_overlay(self):
+        self.stage_overlay.configure(text=TIMER.format_table())
+        self.stage_overlay_job = self.app.after(1000, self.refresh_stage_overlay)
+
     def get_number_from_textbox(self, textbox):
         try:
             text = textbox.get("1.0", "end-1c").strip()
@@ -724,7 +882,9 @@ class ConveyorControllerV2:
                        lambda: self.set_motor_to_finished(buttontorun, textbox, button_list))
 
     def set_motor_to_finished(self, buttontorun, textbox, button_list):
-        buttontorun.configure(text="Run Conveyor(s) (C1/C2)",state="normal")
+        # stays disabled if the session was reset while the belts were running
+        state = "disabled" if self.priority_enabled else "normal"
+        buttontorun.configure(text="Run Conveyor(s) (C1/C2)",state=state)
         print("Done Running!")
         self.mc.stop_motors()
         for button in button_list:
@@ -0,0 +1,59 @@
+import json, logging, threading, time
+from collections import deque
+
+# Leveled logging plus a ring buffer of structured events that is cheap enough to
+# leave on in production.
+#   log = get_logger(__name__)      # "mango.<module>", prints like print() did
+#   log.debug("GPIO.output(%s, %s)", pin, state)   # no formatting unless enabled
+#   EVENTS.add("grade", letter="A", score=2.5)    # one dict append, no I/O
+# EVENTS.dump(path) writes the buffer as JSON lines (GradingEngine does this into
+# the session folder on shutdown). Levels come from runtime_config.json
+# ('log_level', 'event_log_size'), see configure_logging.
+
+ROOT_LOGGER = "mango"
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+class EventLog:
+    def __init__(self, size=2000):
+        self.events = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def resize(self, size):
+        with self.lock:
+            self.events = deque(self.events, maxlen=size)
+
+    def add(self, event, **fields):
+        # deque.append is atomic, fields are only serialized in dump()
+        fields['t'] = time.time()
+        fields['event'] = event
+        self.events.append(fields)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.events)
+
+    def dump(self, path):
+        events = self.snapshot()
+        with open(path, "w") as f:
+            for event in events:
+                f.write(json.dumps(event, default=str) + "\n")
+        return len(events)
+
+EVENTS = EventLog()
+
+def configure_logging(level="INFO", event_log_size=None):
+    # safe to call again (e.g. after the runtime config is loaded)
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if event_log_size:
+        EVENTS.resize(event_log_size)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
+
+configure_logging()
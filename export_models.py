@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Writes frozen TorchScript and ONNX artifacts for the grading models so the app
+# can run them without building the networks in Python (see inference_backend.py).
+#
+#   python export_models.py
+#   python export_models.py --formats onnx --rcnn mango_detection_model_more_stop.pth
+
+import argparse
+import os
+import torch
+from inference_backend import EXPORT_DIR, exported_path
+from quantize_models import freeze_same_padding
+
+CLASSIFIERS = {'ripeness': ("ripeness_v2b3.pth", 3), 'bruises': ("bruises_v2b3.pth", 2)}
+INPUT_SIZE = (300, 300)
+RCNN_INPUT_SIZE = (1080, 1920)
+
+def build_classifier(checkpoint_path, num_classes):
+    import timm
+    model = timm.create_model('tf_efficientnetv2_b3', pretrained=False, num_classes=num_classes)
+    model.load_state_dict(torch.load(checkpoint_path, map_location="cpu"))
+    model.eval()
+    return freeze_same_padding(model, INPUT_SIZE)
+
+def export_classifier(checkpoint_path, num_classes, formats, export_dir):
+    model = build_classifier(checkpoint_path, num_classes)
+    example = torch.zeros(1, 3, *INPUT_SIZE)
+    if 'torchscript' in formats:
+        with torch.no_grad():
+            scripted = torch.jit.freeze(torch.jit.trace(model, example))
+        path = exported_path(checkpoint_path, 'torchscript', export_dir)
+        torch.jit.save(scripted, path)
+        print(f"Saved {path}")
+    if 'onnx' in formats:
+        path = exported_path(checkpoint_path, 'onnx', export_dir)
+        torch.onnx.export(model, (example,), path, opset_version=17,
+                          input_names=["input"], output_names=["logits"],
+                          dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                          dynamo=False)
+        print(f"Saved {path}")
+
+def export_detector(checkpoint_path, formats, export_dir):
+    from rcnn_size import MangoMeasurementSystem
+    model = MangoMeasurementSystem(checkpoint_path).model
+    if model is None:
+        print(f"Skipping detector export, could not load {checkpoint_path}")
+        return
+    model = model.cpu()
+    if 'torchscript' in formats:
+        # detectors have data dependent control flow, so script instead of trace
+        path = exported_path(checkpoint_path, 'torchscript', export_dir)
+        torch.jit.save(torch.jit.script(model), path)
+        print(f"Saved {path}")
+    if 'onnx' in formats:
+        path = exported_path(checkpoint_path, 'onnx', export_dir)
+        example = torch.rand(3, *RCNN_INPUT_SIZE)
+        torch.onnx.export(model, ([example],), path, opset_version=17,
+                          input_names=["image"], output_names=["boxes", "labels", "scores"],
+                          dynamic_axes={"image": {1: "height", 2: "width"}},
+                          dynamo=False)
+        print(f"Saved {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the grading models to TorchScript and ONNX")
+    parser.add_argument("--ripeness", default=CLASSIFIERS['ripeness'][0])
+    parser.add_argument("--bruises", default=CLASSIFIERS['bruises'][0])
+    parser.add_argument("--rcnn", default="mango_detection_model_more_stop.pth")
+    parser.add_argument("--formats", nargs="+", choices=["torchscript", "onnx"],
+                        default=["torchscript", "onnx"])
+    parser.add_argument("--out-dir", default=EXPORT_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    with torch.no_grad():
+        export_classifier(args.ripeness, CLASSIFIERS['ripeness'][1], args.formats, args.out_dir)
+        export_classifier(args.bruises, CLASSIFIERS['bruises'][1], args.formats, args.out_dir)
+        export_detector(args.rcnn, args.formats, args.out_dir)
+
+if __name__ == "__main__":
+    main()
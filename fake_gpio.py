@@ -1,4 +1,8 @@
 # This is just for testing with laptop without raspberrypi
+from event_log import get_logger
+
+# every call is logged at DEBUG; the stepper loop calls output() thousands of times
+log = get_logger("fake_gpio")
 
 class FakeGPIO:
     # GPIO modes
@@ -25,28 +29,28 @@ class FakeGPIO:
     
     @staticmethod
     def setmode(mode):
-        print(f"[FAKE] GPIO.setmode({mode})")
+        log.debug("[FAKE] GPIO.setmode(%s)", mode)
     
     @staticmethod
     def setwarnings(flag):
-        print(f"[FAKE] GPIO.setwarnings({flag})")
+        log.debug("[FAKE] GPIO.setwarnings(%s)", flag)
     
     @staticmethod
     def setup(channel, mode, pull_up_down=PUD_OFF):
-        print(f"[FAKE] GPIO.setup({channel}, {mode}, pull_up_down={pull_up_down})")
+        log.debug("[FAKE] GPIO.setup(%s, %s, pull_up_down=%s)", channel, mode, pull_up_down)
     
     @staticmethod
     def output(channel, state):
-        print(f"[FAKE] GPIO.output({channel}, {state})")
+        log.debug("[FAKE] GPIO.output(%s, %s)", channel, state)
     
     @staticmethod
     def input(channel):
-        print(f"[FAKE] GPIO.input({channel}) -> 0")
+        log.debug("[FAKE] GPIO.input(%s) -> 0", channel)
         return 0
     
     @staticmethod
     def cleanup():
-        print("[FAKE] GPIO.cleanup()")
+        log.debug("[FAKE] GPIO.cleanup()")
     
     @staticmethod
     def PWM(channel, frequency):
@@ -54,34 +58,34 @@ class FakeGPIO:
     
     @staticmethod
     def add_event_detect(channel, edge, callback=None, bouncetime=None):
-        print(f"[FAKE] GPIO.add_event_detect({channel}, {edge})")
+        log.debug("[FAKE] GPIO.add_event_detect(%s, %s)", channel, edge)
     
     @staticmethod
     def remove_event_detect(channel):
-        print(f"[FAKE] GPIO.remove_event_detect({channel})")
+        log.debug("[FAKE] GPIO.remove_event_detect(%s)", channel)
     
     @staticmethod
     def event_detected(channel):
-        print(f"[FAKE] GPIO.event_detected({channel}) -> False")
+        log.debug("[FAKE] GPIO.event_detected(%s) -> False", channel)
         return False
 
 class FakePWM:
     def __init__(self, channel, frequency):
         self.channel = channel
         self.frequency = frequency
-        print(f"[FAKE] PWM created on channel {channel} with frequency {frequency}")
+        log.debug("[FAKE] PWM created on channel %s with frequency %s", channel, frequency)
     
     def start(self, duty_cycle):
-        print(f"[FAKE] PWM.start({duty_cycle}) on channel {self.channel}")
+        log.debug("[FAKE] PWM.start(%s) on channel %s", duty_cycle, self.channel)
     
     def stop(self):
-        print(f"[FAKE] PWM.stop() on channel {self.channel}")
+        log.debug("[FAKE] PWM.stop() on channel %s", self.channel)
     
     def ChangeDutyCycle(self, duty_cycle):
-        print(f"[FAKE] PWM.ChangeDutyCycle({duty_cycle}) on channel {self.channel}")
+        log.debug("[FAKE] PWM.ChangeDutyCycle(%s) on channel %s", duty_cycle, self.channel)
     
     def ChangeFrequency(self, frequency):
-        print(f"[FAKE] PWM.ChangeFrequency({frequency}) on channel {self.channel}")
+        log.debug("[FAKE] PWM.ChangeFrequency(%s) on channel %s", frequency, self.channel)
         self.frequency = frequency
 
 # Create the mock GPIO instance
@@ -4,6 +4,15 @@ import time
 import threading
 from typing import Dict, Any, Optional, Tuple, List
 import numpy as np
+from event_log import get_logger
+
+log = get_logger("fake_picamera2")
+
+def sensor_timestamp():
+    # same clock as libcamera's SensorTimestamp: ns on CLOCK_BOOTTIME
+    if hasattr(time, 'CLOCK_BOOTTIME'):
+        return time.clock_gettime_ns(time.CLOCK_BOOTTIME)
+    return time.monotonic_ns()
 
 class FakePicamera2:
     """Fake implementation of Picamera2 for testing on non-RPi systems"""
@@ -14,7 +23,7 @@ class FakePicamera2:
         self.is_recording = False
         self.recording_thread = None
         self.preview_running = False
-        print("[Fake] Picamera2() initialized")
+        log.debug("[Fake] Picamera2() initialized")
     
     def create_preview_configuration(self, main=None, lores=None, raw=None, transform=None, colour_space=None, buffer_count=None, controls=None):
         """Fake preview configuration creation"""
@@ -27,7 +36,7 @@ class FakePicamera2:
             'buffer_count': buffer_count or 4,
             'controls': controls or {}
         }
-        print(f"[Fake] create_preview_configuration() -> {config}")
+        log.debug("[Fake] create_preview_configuration() -> %s", config)
         return config
     
     def create_still_configuration(self, main=None, lores=None, raw=None, transform=None, colour_space=None, buffer_count=None, controls=None):
@@ -41,7 +50,7 @@ class FakePicamera2:
             'buffer_count': buffer_count or 2,
             'controls': controls or {}
         }
-        print(f"[Fake] create_still_configuration() -> {config}")
+        log.debug("[Fake] create_still_configuration() -> %s", config)
         return config
     
     def create_video_configuration(self, main=None, lores=None, raw=None, transform=None, colour_space=None, buffer_count=None, controls=None):
@@ -55,20 +64,20 @@ class FakePicamera2:
             'buffer_count': buffer_count or 6,
             'controls': controls or {}
         }
-        print(f"[Fake] create_video_configuration() -> {config}")
+        log.debug("[Fake] create_video_configuration() -> %s", config)
         return config
     
     def configure(self, config):
         """Fake camera configuration"""
         self.camera_config = config
-        print(f"[Fake] configure() with config: {config}")
+        log.debug("[Fake] configure() with config: %s", config)
     
     def start(self, config=None, show_preview=False):
         """Fake camera start"""
         if config:
             self.configure(config)
         self.is_started = True
-        print(f"[Fake] start() - Camera started, show_preview={show_preview}")
+        log.debug("[Fake] start() - Camera started, show_preview=%s", show_preview)
     
     def stop(self):
         """Fake camera stop"""
@@ -76,12 +85,12 @@ class FakePicamera2:
         self.is_recording = False
         if self.recording_thread:
             self.recording_thread = None
-        print("[Fake] stop() - Camera stopped")
+        log.debug("[Fake] stop() - Camera stopped")
     
     def close(self):
         """Fake camera close"""
         self.stop()
-        print("[Fake] close() - Camera closed")
+        log.debug("[Fake] close() - Camera closed")
     
     def capture_array(self, name="main"):
         """Fake array capture - returns fake image data"""
@@ -89,38 +98,49 @@ class FakePicamera2:
             raise RuntimeError("Camera not started")
         
         # Create fake image data based on configuration
-        if self.camera_config and name in self.camera_config:
-            size = self.camera_config[name].get('size', (640, 480))
+        stream = self.camera_config.get(name) if self.camera_config else None
+        if stream:
+            size = stream.get('size', (640, 480))
         else:
             size = (640, 480)
         
-        # Generate fake RGB image data
-        fake_image = np.random.randint(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+        if stream and stream.get('format') == 'YUV420':
+            # planar Y then U and V at quarter resolution, like the real lores stream
+            fake_image = np.random.randint(0, 255, (size[1] * 3 // 2, size[0]), dtype=np.uint8)
+        else:
+            # Generate fake RGB image data
+            fake_image = np.random.randint(0, 255, (size[1], size[0], 3), dtype=np.uint8)
         # print(f"[Fake] capture_array('{name}') -> shape {fake_image.shape}")
         return fake_image
     
+    def capture_request(self, wait=None, flush=None):
+        """Fake request capture - one frame holding every configured stream"""
+        if not self.is_started:
+            raise RuntimeError("Camera not started")
+        return FakeCompletedRequest(self)
+    
     def capture_file(self, name, format=None, wait=True):
         """Fake file capture"""
         if not self.is_started:
             raise RuntimeError("Camera not started")
         
-        print(f"[Fake] capture_file('{name}', format={format}, wait={wait})")
+        log.debug("[Fake] capture_file('%s', format=%s, wait=%s)", name, format, wait)
         
         if wait:
             time.sleep(0.1)  # Simulate capture time
         
         # Create a fake file (in real implementation, this would save an actual image)
-        print(f"[Fake] Image saved to {name}")
+        log.debug("[Fake] Image saved to %s", name)
     
     def start_preview(self, preview=None):
         """Fake preview start"""
         self.preview_running = True
-        print(f"[Fake] start_preview() - Preview started")
+        log.debug("[Fake] start_preview() - Preview started")
     
     def stop_preview(self):
         """Fake preview stop"""
         self.preview_running = False
-        print("[Fake] stop_preview() - Preview stopped")
+        log.debug("[Fake] stop_preview() - Preview stopped")
     
     def start_recording(self, output, format=None, pts=None, audio=False):
         """Fake recording start"""
@@ -128,7 +148,7 @@ class FakePicamera2:
             raise RuntimeError("Camera not started")
         
         self.is_recording = True
-        print(f"[Fake] start_recording('{output}', format={format}, audio={audio})")
+        log.debug("[Fake] start_recording('%s', format=%s, audio=%s)", output, format, audio)
         
         # Simulate recording in a separate thread
         def fake_recording():
@@ -144,11 +164,11 @@ class FakePicamera2:
             self.is_recording = False
             if self.recording_thread:
                 self.recording_thread.join()
-            print("[Fake] stop_recording() - Recording stopped")
+            log.debug("[Fake] stop_recording() - Recording stopped")
     
     def set_controls(self, controls):
         """Fake control setting"""
-        print(f"[Fake] set_controls({controls})")
+        log.debug("[Fake] set_controls(%s)", controls)
     
     def capture_metadata(self):
         """Fake metadata capture"""
@@ -161,7 +181,7 @@ class FakePicamera2:
             'Lux': 100.0,
             'SensorTimestamp': int(time.time() * 1000000)
         }
-        print(f"[Fake] capture_metadata() -> {metadata}")
+        log.debug("[Fake] capture_metadata() -> %s", metadata)
         return metadata
     
     @property
@@ -176,7 +196,7 @@ class FakePicamera2:
             'SensorOutputSize': (3280, 2464),
             'Location': 2,  # CAMERA_LOCATION_FRONT
         }
-        print(f"[Fake] camera_properties -> {properties}")
+        log.debug("[Fake] camera_properties -> %s", properties)
         return properties
     
     def __enter__(self):
@@ -189,18 +209,34 @@ class FakePicamera2:
 
 
 # Additional Fake classes that might be used with Picamera2
+class FakeCompletedRequest:
+    """Fake completed request returned by capture_request()"""
+    def __init__(self, camera):
+        self.camera = camera
+        self.metadata = {'SensorTimestamp': sensor_timestamp()}
+    
+    def make_array(self, name="main"):
+        return self.camera.capture_array(name)
+    
+    def get_metadata(self):
+        return self.metadata
+    
+    def release(self):
+        pass
+
+
 class FakeEncoder:
     """Fake encoder for video recording"""
     def __init__(self, format='h264'):
         self.format = format
-        print(f"[Fake] Encoder({format}) created")
+        log.debug("[Fake] Encoder(%s) created", format)
 
 
 class FakeOutput:
     """Fake output for recording"""
     def __init__(self, filename):
         self.filename = filename
-        print(f"[Fake] Output({filename}) created")
+        log.debug("[Fake] Output(%s) created", filename)
 
 
 # Create the main Fake class that can be imported
@@ -1,3 +1,6 @@
+from event_log import get_logger
+
+log = get_logger("formula_controller")
 
 class FormulaController:
     def __init__(self, ripeness, bruises, size):
@@ -62,7 +65,7 @@ class FormulaController:
         return [all_valid, error_type]
 
     def set_input_priority(self, arr):
-        print(arr)
+        log.info("Priorities: %s", arr)
         self.input_priorities = arr
 
     def get_priorities(self):
@@ -79,7 +82,7 @@ class FormulaController:
             return "C"
 
     def print_grade_formula(self, boundaries):
-        print("Calculated Grade Range")
+        log.debug("Calculated Grade Range")
         for grade in ['A', 'B', 'C']:
             min_val = boundaries[grade]['min']
             max_val = boundaries[grade]['max']
@@ -88,7 +91,7 @@ class FormulaController:
 
     def get_grade_formula_dict(self):
         boundaries = self.get_grade_formula(self.input_priorities)       
-        print("Calculated Grade Range")
+        log.debug("Calculated Grade Range")
         grade_dict = {}
         for grade in ['A', 'B', 'C']:
             min_val = boundaries[grade]['min']
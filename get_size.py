@@ -1,12 +1,12 @@
-import cv2, imutils, json
+import cv2, json
 import numpy as np
-from imutils import perspective
-from scipy.spatial import distance as dist
 import os
-import pandas as pd
+# pandas, scipy and imutils are imported inside the functions that use them, the
+# GUI only needs load_json_file and determine_size from here
 # C:\Users\Kenan\thesis-size
 
 def batch_analyze(self, image_folder, output_csv=None):
+    import pandas as pd
     all_results = []
     image_files = [f for f in os.listdir(image_folder) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
     
@@ -110,6 +110,9 @@ def calculate_real_world_dimension(pixel_dimension, distance_camera_to_object, f
     return (pixel_dimension * distance_camera_to_object) / focal_length_pixels
 
 def calculate_size(img, top, dir):
+    import imutils
+    from imutils import perspective
+    from scipy.spatial import distance as dist
     fg = img['m']
     bg = img['g']
     formatted_date_time = img['f_dt']
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# Grades and sorts mangoes without a display. controller_v2.py is a Tk client of
+# GradingEngine; on a line without a screen run it straight from the CLI:
+#
+#   python grading_engine.py --priorities 3 3 3                  # PLC trigger loop on stdin
+#   python grading_engine.py --priorities 3 3 3 --auto --target-per-minute 6
+#   python grading_engine.py --priorities 3 3 3 --images a_top.png a_bottom.png
+#
+# The trigger loop reads one command per line: "top" and "bottom" capture a side,
+# "bottom" also grades and sorts the mango and prints the result as one JSON line,
+# "stats" prints p50/p95/p99 per pipeline stage (stage_timer.py).
+
+import argparse, json, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import cv2
+from get_size import determine_size
+from camera_manager import CameraManager
+from motor_controller import MotorController
+from formula_controller import FormulaController
+from sorting import SorterController
+from image_writer import ImageWriter
+from auto_sorter import AutoSortPipeline
+from runtime_config import load_runtime_config, apply_torch_threads, pin_current_thread
+from event_log import configure_logging, get_logger, EVENTS
+from stage_timer import TIMER
+
+log = get_logger("grading_engine")
+
+DEFAULT_SETTINGS = {
+    # True shares one backbone between ripeness and bruises (multihead_model.py)
+    'multihead': False,
+    # checkpoint with both heads trained on the shared backbone, required by 'multihead'
+    'merged_path': None,
+    # None for fp32 or 'static' INT8 (quantize_models.py calibrate first)
+    'quantize': None,
+    # quantized engine the INT8 models were calibrated for: 'qnnpack' (Pi) or 'fbgemm' (x86)
+    'quant_backend': "qnnpack",
+    # 'torch', or 'torchscript'/'onnx' after running export_models.py
+    'backend': "torch",
+    # mango_detection_model
+    # mango_detection_model_stopper
+    # mango_detection_model_more_stop
+    'rcnn_path': "mango_detection_model_more_stop.pth",
+    # short side the RCNN runs at, None for the full frame. 750 is what torchvision
+    # scaled 1920x1080 to anyway (bench/bench_detector_size.py sweeps it)
+    'detector_input_size': 750,
+    # writing the captures and the RCNN annotated copies is optional
+    'save_captures': True,
+    'save_annotated': True,
+    'image_format': "png",
+    # run dummy frames through every model before reporting ready
+    'warm_up': True,
+    # classify the padded RCNN mango box instead of the whole frame. Off until
+    # bench/bench_roi_crop.py agrees: the classifiers were trained on whole frames
+    'roi_crop': False,
+    'roi_padding': 0.15,
+    # opt-in: take ripeness/bruises straight from the RCNN class boxes when both are
+    # at least this confident and skip the classifiers for that side, None = never
+    'rcnn_label_confidence': None,
+    # overrides log_level from runtime_config.json
+    'log_level': None,
+    # False skips the camera, belt and sorter: offline grading of saved images only
+    # (batch_grade.py runs one such engine per worker process)
+    'hardware': True,
+    # serve saved captures from this folder instead of the camera (replay_picamera2.py)
+    'replay_dir': None,
+    'replay_fps': None,
+}
+
+# RCNN class name -> (prediction key, classifier label)
+RCNN_LABELS = {'bruised': ('bruises', 'bruised'), 'not_bruised': ('bruises', 'unbruised'),
+               'yellow': ('ripeness', 'yellow'), 'green_yellow': ('ripeness', 'yellow_green'),
+               'green': ('ripeness', 'green')}
+
+# auto mode feeds, captures, grades and sorts without an operator.
+# belt arrays/times depend on the line and need tuning on the conveyor
+AUTO_SETTINGS = {'target_per_minute': 4.0, 'queue_size': 2,
+                 'top_move': [1, 0, 0, 0], 'top_time': 3.0,
+                 'bottom_move': [1, 0, 1, 0], 'bottom_time': 3.0,
+                 # belt cycles from the bottom capture into the sorter: the next
+                 # top_move carries the mango there, so it waits for that grade
+                 'sorter_distance': 1}
+
+# SorterController relays for each grade
+SORT_MOTORS = {'A': [0, 1, 0, 0], 'B': [1, 0, 1, 0], 'C': [1, 0, 0, 1]}
+
+class GradingEngine:
+    # load_models=False leaves the models to start_loading(), so a GUI can show its
+    # window and camera preview while the checkpoints are still being read
+    def __init__(self, settings=None, load_models=True):
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self.RIPENESS_SCORES = {'green': 3.0, 'yellow': 1.0, 'yellow_green': 2.0}
+        self.BRUISES_SCORES = {'bruised': 1.0, 'unbruised': 2.0}
+        self.SIZE_SCORES = {'small': 1.0, 'medium': 2.0, 'large': 3.0}
+        self.ai = None
+        self.rcnn_size = None
+        self.models_ready = threading.Event()
+        self.load_times = {}
+        self.load_errors = {}
+        self.warmup_stats = {}
+        # sides graded from the RCNN labels vs through the classifiers
+        self.path_counts = {'rcnn': 0, 'classifiers': 0}
+        # torch thread counts and CPU pinning, see runtime_config.py
+        self.runtime = load_runtime_config()
+        configure_logging(self.settings['log_level'] or self.runtime['log_level'],
+                          self.runtime['event_log_size'])
+        self.session_dir = None
+        self.loaders = {'classifiers': self.load_classifiers, 'rcnn': self.load_detector}
+        self.mc = self.camera = self.sort = None
+        if self.settings['hardware']:
+            self.mc = MotorController()
+            self.mc.setup_gpio()
+            self.camera = CameraManager(replay_dir=self.settings['replay_dir'],
+                                        replay_fps=self.settings['replay_fps'])
+            self.camera.start_capture_thread(cpus=self.runtime['ui_cpus'])
+            self.sort = SorterController()
+            self.sort.setup_gpio()
+        self.formula = FormulaController(self.RIPENESS_SCORES, self.BRUISES_SCORES, self.SIZE_SCORES)
+        # captures are written in the background straight into Grade-X once graded
+        self.writer = ImageWriter(image_format=self.settings['image_format'],
+                                  compress_level=1, max_pending=8)
+        if load_models:
+            self.load_models()
+
+    def load_classifiers(self):
+        # torch/timm are imported here so they load off the GUI thread too
+        import torch
+        from ai_analyzer import AIAnalyzer
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.ai = AIAnalyzer(self.device, self.RIPENESS_SCORES, self.BRUISES_SCORES, self.SIZE_SCORES,
+                             multihead=self.settings['multihead'],
+                             merged_path=self.settings['merged_path'],
+                             quantize=self.settings['quantize'],
+                             quant_backend=self.settings['quant_backend'],
+                             backend=self.settings['backend'])
+
+    def load_detector(self):
+        from rcnn_size import MangoMeasurementSystem
+        self.rcnn_size = MangoMeasurementSystem(self.settings['rcnn_path'],
+                                                backend=self.settings['backend'],
+                                                input_size=self.settings['detector_input_size'])
+
+    def load_models(self, on_loaded=None):
+        # classifiers and RCNN load side by side, on_loaded(name, error) fires as each
+        # finishes and once more as on_loaded('ready', None) after the warm-up
+        started = time.monotonic()
+        # the loader threads, the ripeness executor and torch's own pool are all
+        # started from here, so they inherit the inference CPUs
+        pin_current_thread(self.runtime['inference_cpus'])
+        # import the shared packages once up front: two loaders importing
+        # torchvision at the same time can see it partially initialized
+        import torch, torchvision
+        apply_torch_threads(self.runtime)
+        with ThreadPoolExecutor(max_workers=len(self.loaders)) as pool:
+            futures = {pool.submit(loader): name for name, loader in self.loaders.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                error = future.exception()
+                self.load_times[name] = time.monotonic() - started
+                if error:
+                    self.load_errors[name] = error
+                    log.error("Error loading %s: %s", name, error)
+                else:
+                    log.info("Loaded %s in %.2fs", name, self.load_times[name])
+                if on_loaded:
+                    on_loaded(name, error)
+        if self.load_errors:
+            return False
+        if self.settings['warm_up']:
+            self.warm_up()
+            self.load_times['warm_up'] = time.monotonic() - started
+            # keep the dummy frames out of the stage latencies
+            TIMER.reset()
+        self.models_ready.set()
+        if on_loaded:
+            on_loaded('ready', None)
+        return True
+
+    def warm_up(self):
+        frame_size = (1080, 1920)
+        if self.camera:
+            frame_size = (self.camera.resolution['width'], self.camera.resolution['length'])
+        self.warmup_stats = {'classifiers': self.ai.warm_up(frame_size),
+                             'rcnn': self.rcnn_size.warm_up(frame_size)}
+        return self.warmup_stats
+
+    def start_loading(self, on_loaded=None):
+        thread = threading.Thread(target=self.load_models, args=(on_loaded,), daemon=True)
+        thread.start()
+        return thread
+
+    def create_session(self, priorities):
+        self.formula.set_input_priority(priorities)
+        img_dir = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        os.makedirs(img_dir, exist_ok=True)
+        # Create subdirectories for Grade-A, Grade-B, and Grade-C inside it
+        for grade in ["Grade-A", "Grade-B", "Grade-C"]:
+            os.makedirs(os.path.join(img_dir, grade), exist_ok=True)
+        # === Save input priorities to a text file ===
+        txt_path = os.path.join(img_dir, "input_priorities.txt")
+        with open(txt_path, "w") as f:
+            for key, val in priorities.items():
+                f.write(f"{key}: {val}\n")
+        self.session_dir = img_dir
+        EVENTS.add("session", img_dir=img_dir, priorities=priorities)
+        log.info("Created directories under %s", img_dir)
+        log.info("Saved priorities to %s", txt_path)
+        return img_dir
+
+    def capture(self):
+        with TIMER.span("capture"):
+            return self.camera.get_full_frame()
+
+    def measure(self, image, img_path):
+        # every detection of 10 cm or more, most confident first
+        with TIMER.span("rcnn"):
+            results = self.rcnn_size.measure_array(image)
+        if results and self.settings['save_annotated']:
+            # drawn and written on the writer thread, next to the capture
+            name = os.path.splitext(os.path.basename(img_path))[0] + "_measured"
+            self.writer.submit(lambda: self.rcnn_size.annotate(image, results),
+                               self.writer.path_for(os.path.dirname(img_path), name))
+        if not results:
+            log.info("No mangoes detected")
+        return sorted(results, key=lambda x: x['confidence'], reverse=True)
+
+    def labels_from_rcnn(self, results):
+        # ripeness and bruises from the detector's own class boxes, None unless
+        # both are above the configured confidence
+        threshold = self.settings['rcnn_label_confidence']
+        if threshold is None:
+            return None
+        pred = {}
+        for result in results:
+            if result['class'] not in RCNN_LABELS or result['confidence'] < threshold:
+                continue
+            key, label = RCNN_LABELS[result['class']]
+            if key not in pred:
+                pred[key] = label
+                pred[f"{key}_confidence"] = float(result['confidence'])
+        if 'ripeness' not in pred or 'bruises' not in pred:
+            return None
+        return pred
+
+    def crop_box(self, detection, image):
+        # padded classifier crop for one side, None falls back to the whole frame
+        if detection is None or not self.settings['roi_crop']:
+            return None
+        # preprocess pulls in torch, keep it out of the engine's import time
+        from preprocess import pad_box
+        return pad_box(detection['bounding_box'], image.shape, self.settings['roi_padding'])
+
+    def analyze(self, images, recorded_time, img_dir, progress=None):
+        # images is {side: array}. The RCNN runs first so the classifiers only see
+        # the mango; all sides then go through the classifiers as one batch.
+        # progress(fraction, stage) is called before each step; raising from it
+        # (e.g. a cancelled GUI job) stops the work there
+        progress = progress or (lambda fraction, stage: None)
+        sides = list(images)
+        detections, preds = {}, {}
+        progress(0.1, "Measuring")
+        for side in sides:
+            path_img = os.path.join(img_dir, f"{recorded_time}_{side}.png")
+            results = self.measure(images[side], path_img)
+            detections[side] = results[0] if results else None
+            pred = self.labels_from_rcnn(results)
+            if pred:
+                log.debug("RCNN labels %s: %s, %s, skipping classifiers", side, pred['ripeness'], pred['bruises'])
+                preds[side] = dict(pred, source='rcnn')
+        # only the sides the detector was not sure about go through the classifiers
+        unsure = [side for side in sides if side not in preds]
+        if unsure:
+            progress(0.4, "Classifying")
+            boxes = [self.crop_box(detections[side], images[side]) for side in unsure]
+            for side, pred in zip(unsure, self.ai.predict([images[side] for side in unsure], boxes)):
+                preds[side] = dict(pred, source='classifiers')
+        self.path_counts['rcnn'] += len(sides) - len(unsure)
+        self.path_counts['classifiers'] += len(unsure)
+        ai_preds = {}
+        for side in sides:
+            detection = detections[side]
+            length = detection['length_cm'] if detection else 0
+            width = detection['width_cm'] if detection else 0
+            log.debug("RCNN %s Length: %.2f cm, Width: %.2f cm", side, length, width)
+            ai_preds[side] = {'ripeness': preds[side]['ripeness'],
+                              'bruises': preds[side]['bruises'],
+                              'size': determine_size(length, width),
+                              'source': preds[side]['source']}
+        return ai_preds
+
+    def score_side(self, ai_pred, priorities=None):
+        with TIMER.span("grading"):
+            num_grade = self.ai.get_overall_grade(ai_pred, priorities or self.formula.get_priorities())
+            return num_grade, self.formula.get_grade_letter(num_grade)
+
+    def grade_side(self, image, side, recorded_time, img_dir, priorities=None, progress=None):
+        ai_pred = self.analyze({side: image}, recorded_time, img_dir, progress)[side]
+        if progress:
+            progress(0.8, "Grading")
+        num_grade, letter_grade = self.score_side(ai_pred, priorities)
+        return {'side': side, 'ai_pred': ai_pred,
+                'num_grade': num_grade, 'letter_grade': letter_grade}
+
+    def grade_predictions(self, top_pred, bottom_pred, priorities=None):
+        top_score, top_letter = self.score_side(top_pred, priorities)
+        bottom_score, bottom_letter = self.score_side(bottom_pred, priorities)
+        ave_score = (top_score + bottom_score) / 2
+        result = {'top_pred': top_pred, 'bottom_pred': bottom_pred,
+                  'top_score': top_score, 'top_letter': top_letter,
+                  'bottom_score': bottom_score, 'bottom_letter': bottom_letter,
+                  'ave_score': ave_score, 'letter': self.formula.get_grade_letter(ave_score)}
+        EVENTS.add("grade", letter=result['letter'], ave_score=ave_score,
+                   top=top_pred, bottom=bottom_pred)
+        return result
+
+    def grade_mango(self, top, bottom, recorded_time=None, img_dir="", sort=True):
+        recorded_time = recorded_time or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        ai_preds = self.analyze({'top': top, 'bottom': bottom}, recorded_time, img_dir)
+        result = self.grade_predictions(ai_preds['top'], ai_preds['bottom'])
+        result['recorded_time'] = recorded_time
+        self.save_captures(recorded_time, {'top': top, 'bottom': bottom},
+                           self.grade_folder(img_dir, result['letter']))
+        if sort:
+            self.sort_mango(result['letter'])
+        return result
+
+    def grade_folder(self, img_dir, letter):
+        return os.path.join(img_dir, f"Grade-{letter.upper()}")
+
+    def save_captures(self, recorded_time, images, folder):
+        if not self.settings['save_captures']:
+            return
+        for side, image in images.items():
+            self.writer.submit(image, self.writer.path_for(folder, f"{recorded_time}_{side}"))
+
+    def sort_mango(self, letter):
+        button_state_array = SORT_MOTORS.get(letter.upper())
+        if button_state_array and self.sort:
+            log.debug("Sorting grade %s: %s", letter, button_state_array)
+            self.sort.set_motors(button_state_array)
+
+    def create_auto_pipeline(self, img_dir, settings=None, on_result=None):
+        return AutoSortPipeline(self, dict(AUTO_SETTINGS, **(settings or {})), img_dir, on_result)
+
+    def dump_events(self, path=None):
+        # the in-memory event ring as JSON lines, by default into the session folder
+        path = path or os.path.join(self.session_dir or ".", "events.jsonl")
+        count = EVENTS.dump(path)
+        log.info("Wrote %d events to %s", count, path)
+        return path
+
+    def dump_stage_times(self, path=None):
+        # p50/p95/p99 per pipeline stage, see stage_timer.py
+        path = path or os.path.join(self.session_dir or ".", "stage_times.json")
+        TIMER.dump(path)
+        log.info("%s", TIMER.format_table())
+        log.info("Wrote stage times to %s", path)
+        return path
+
+    def shutdown(self):
+        # the queued captures are written first, so their png_save spans are in the dump
+        self.writer.close()
+        self.dump_events()
+        self.dump_stage_times()
+        if self.settings['rcnn_label_confidence'] is not None:
+            log.info("Sides graded from RCNN labels: %d, by the classifiers: %d",
+                     self.path_counts['rcnn'], self.path_counts['classifiers'])
+        if not self.settings['hardware']:
+            return
+        self.sort.stop_motors()
+        self.mc.stop_motors()
+        self.sort.clean_gpio()
+        self.mc.clean_gpio()
+        self.camera.stop_camera()
+
+def print_result(result):
+    keys = ['recorded_time', 'letter', 'ave_score', 'top_score', 'bottom_score', 'top_pred', 'bottom_pred']
+    print(json.dumps({key: result[key] for key in keys}), flush=True)
+
+def run_trigger_loop(engine, img_dir):
+    top = None
+    for line in sys.stdin:
+        command = line.strip().lower()
+        if command in ("top", "bottom"):
+            try:
+                if command == "top":
+                    engine.sort.stop_motors()
+                    top = engine.capture()
+                    print("OK top", flush=True)
+                elif top is None:
+                    print("ERROR capture top first", flush=True)
+                else:
+                    print_result(engine.grade_mango(top, engine.capture(), img_dir=img_dir))
+                    top = None
+            except Exception as e:
+                # one bad frame must not end the loop: report it, start over with top
+                log.exception("Error on %s", command)
+                print(f"ERROR {type(e).__name__}: {e}", flush=True)
+                top = None
+        elif command == "stats":
+            print(json.dumps(TIMER.summary()), flush=True)
+        elif command in ("quit", "exit"):
+            break
+        elif command:
+            print(f"ERROR unknown command {command}", flush=True)
+
+def run_auto(engine, img_dir, target_per_minute, count):
+    pipeline = engine.create_auto_pipeline(img_dir, {'target_per_minute': target_per_minute},
+                                           on_result=lambda mango, stats: print_result(mango))
+    pipeline.start()
+    try:
+        while pipeline.is_running() and (not count or pipeline.completed < count):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    pipeline.stop()
+    print(json.dumps(dict(pipeline.get_stats(), paths=engine.path_counts)), flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade and sort mangoes without the GUI")
+    parser.add_argument("--priorities", nargs=3, type=float, default=[3.0, 3.0, 3.0],
+                        metavar=("RIPENESS", "BRUISES", "SIZE"))
+    parser.add_argument("--backend", choices=["torch", "torchscript", "onnx"], default="torch")
+    parser.add_argument("--auto", action="store_true", help="Run the belt and sorter continuously")
+    parser.add_argument("--target-per-minute", type=float, default=AUTO_SETTINGS['target_per_minute'])
+    parser.add_argument("--count", type=int, default=0, help="Stop auto mode after this many mangoes")
+    parser.add_argument("--images", nargs=2, metavar=("TOP", "BOTTOM"),
+                        help="Grade two saved captures instead of the camera")
+    parser.add_argument("--no-save", action="store_true", help="Do not write captures")
+    parser.add_argument("--rcnn-labels", type=float, metavar="CONFIDENCE",
+                        help="Use the RCNN ripeness/bruise labels at or above this confidence")
+    parser.add_argument("--replay", metavar="DIR", help="Replay the captures in a session folder as the camera")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Overrides log_level in runtime_config.json")
+    args = parser.parse_args()
+
+    engine = GradingEngine({'backend': args.backend,
+                            'save_captures': not args.no_save,
+                            'save_annotated': not args.no_save,
+                            'rcnn_label_confidence': args.rcnn_labels,
+                            'log_level': args.log_level,
+                            'replay_dir': args.replay})
+    if not engine.models_ready.is_set():
+        engine.shutdown()
+        sys.exit(1)
+    priorities = dict(zip(['ripeness', 'bruises', 'size'], args.priorities))
+    img_dir = engine.create_session(priorities)
+    try:
+        if args.images:
+            top, bottom = [cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB) for path in args.images]
+            print_result(engine.grade_mango(top, bottom, img_dir=img_dir, sort=False))
+        elif args.auto:
+            run_auto(engine, img_dir, args.target_per_minute, args.count)
+        else:
+            run_trigger_loop(engine, img_dir)
+    finally:
+        engine.shutdown()
+
+if __name__ == "__main__":
+    main()
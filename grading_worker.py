@@ -0,0 +1,85 @@
+import itertools, queue, threading
+from runtime_config import pin_current_thread
+
+class GradingCancelled(Exception):
+    pass
+
+class GradingJob:
+    def __init__(self, job_id, payload, on_result, on_progress=None, on_error=None):
+        self.job_id = job_id
+        self.payload = payload
+        self.on_result = on_result
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.cancelled = threading.Event()
+
+    def check_cancelled(self):
+        # called by the process function between stages
+        if self.cancelled.is_set():
+            raise GradingCancelled(f"Job {self.job_id} cancelled")
+
+class GradingWorker:
+    # Runs process_fn(job, report_progress) for each submitted capture on one
+    # background thread and posts progress/results back to the Tk loop with
+    # app.after, so callbacks are always safe to touch widgets.
+    def __init__(self, app, process_fn, cpus=None):
+        self.app = app
+        self.process_fn = process_fn
+        self.cpus = cpus
+        self.jobs = queue.Queue()
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+        self.thread = threading.Thread(target=self.worker_loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, payload, on_result, on_progress=None, on_error=None):
+        job = GradingJob(next(self.job_ids), payload, on_result, on_progress, on_error)
+        with self.pending_lock:
+            self.pending[job.job_id] = job
+        self.jobs.put(job)
+        return job.job_id
+
+    def cancel(self, job_id):
+        with self.pending_lock:
+            job = self.pending.get(job_id)
+        if job:
+            job.cancelled.set()
+
+    def cancel_all(self):
+        with self.pending_lock:
+            jobs = list(self.pending.values())
+        for job in jobs:
+            job.cancelled.set()
+
+    def is_busy(self):
+        with self.pending_lock:
+            return bool(self.pending)
+
+    def post(self, callback, *args):
+        if callback:
+            self.app.after(0, lambda: callback(*args))
+
+    def worker_loop(self):
+        pin_current_thread(self.cpus)
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            report_progress = lambda value, message, job=job: self.post(job.on_progress, value, message)
+            try:
+                job.check_cancelled()
+                result = self.process_fn(job, report_progress)
+                outcome = (job.on_result, result)
+            except Exception as e:
+                if not isinstance(e, GradingCancelled):
+                    print(f"Error grading job {job.job_id}: {e}")
+                outcome = (job.on_error, e)
+            with self.pending_lock:
+                self.pending.pop(job.job_id, None)
+            self.post(outcome[0], outcome[1])
+
+    def stop(self):
+        self.cancel_all()
+        self.jobs.put(None)
+        self.thread.join(timeout=5)
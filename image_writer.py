@@ -0,0 +1,72 @@
+import os, queue, threading
+import numpy as np
+from PIL import Image
+from stage_timer import TIMER
+from event_log import get_logger
+
+log = get_logger("image_writer")
+
+class ImageWriter:
+    # Encodes and writes captures on background threads so the Tk thread never
+    # waits on PNG/JPEG compression. submit() blocks once max_pending images are
+    # queued, which keeps a slow SD card from piling up 1920x1080 frames in memory.
+    def __init__(self, image_format="png", compress_level=1, quality=90,
+                 max_pending=8, num_workers=1):
+        self.image_format = image_format.lower()
+        self.compress_level = compress_level  # png: 0 (fastest) - 9 (smallest)
+        self.quality = quality                # jpeg: 1 - 95
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.workers = []
+        for _ in range(num_workers):
+            worker = threading.Thread(target=self.worker_loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def get_extension(self):
+        return "jpg" if self.image_format in ("jpg", "jpeg") else "png"
+
+    def path_for(self, directory, name):
+        return os.path.join(directory, f"{name}.{self.get_extension()}")
+
+    def submit(self, image, path, timeout=None):
+        # image: RGB ndarray, PIL image, or a callable returning one on the writer thread
+        if self.queue.full():
+            log.warning("Image writer busy, waiting to queue %s", path)
+        self.queue.put((image, path), timeout=timeout)
+
+    def worker_loop(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self.write(*item)
+            except Exception as e:
+                log.error("Error saving image %s: %s", item[1], e)
+            finally:
+                self.queue.task_done()
+
+    def write(self, image, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if callable(image):
+            # rendered here, e.g. the RCNN annotated copy
+            image = image()
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image[..., :3])
+        with TIMER.span("png_save"):
+            if self.get_extension() == "jpg":
+                image.save(path, "JPEG", quality=self.quality)
+            else:
+                image.save(path, "PNG", compress_level=self.compress_level)
+        log.debug("Saved image to: %s", path)
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        self.flush()
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import torch
+from event_log import get_logger
+
+log = get_logger("inference_backend")
+
+# Artifacts written by export_models.py, named after the checkpoint they came from:
+#   exported/ripeness_v2b3.ts, exported/ripeness_v2b3.onnx, ...
+EXPORT_DIR = "exported"
+BACKEND_EXTENSIONS = {'torchscript': ".ts", 'onnx': ".onnx"}
+
+def exported_path(checkpoint_path, backend, export_dir=EXPORT_DIR):
+    stem = os.path.splitext(os.path.basename(checkpoint_path))[0]
+    return os.path.join(export_dir, stem + BACKEND_EXTENSIONS[backend])
+
+class TorchScriptClassifier:
+    def __init__(self, path, device):
+        self.model = torch.jit.load(path, map_location=device)
+        self.model.eval()
+
+    def __call__(self, batch):
+        return self.model(batch)
+
+class OnnxClassifier:
+    # Takes and returns torch tensors so AIAnalyzer can call it like the nn.Module
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        outputs = self.session.run(None, {self.input_name: np.ascontiguousarray(batch.cpu().numpy())})
+        return torch.from_numpy(outputs[0])
+
+class TorchScriptDetector:
+    def __init__(self, path, device):
+        self.model = torch.jit.load(path, map_location=device)
+        self.model.eval()
+
+    def __call__(self, images):
+        # scripted torchvision detectors return (losses, detections)
+        output = self.model(list(images))
+        return output[1] if isinstance(output, tuple) else output
+
+class OnnxDetector:
+    # Same output format as torchvision detectors: one dict per image
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, images):
+        predictions = []
+        for image in images:
+            image = np.ascontiguousarray(image.cpu().numpy())
+            boxes, labels, scores = self.session.run(None, {self.input_name: image})
+            predictions.append({'boxes': torch.from_numpy(boxes),
+                                'labels': torch.from_numpy(labels),
+                                'scores': torch.from_numpy(scores)})
+        return predictions
+
+def load_classifier(checkpoint_path, backend, device):
+    path = exported_path(checkpoint_path, backend)
+    log.info("Loading %s classifier %s", backend, path)
+    if backend == 'onnx':
+        return OnnxClassifier(path)
+    return TorchScriptClassifier(path, device)
+
+def load_detector(checkpoint_path, backend, device):
+    path = exported_path(checkpoint_path, backend)
+    log.info("Loading %s detector %s", backend, path)
+    if backend == 'onnx':
+        return OnnxDetector(path)
+    return TorchScriptDetector(path, device)
@@ -1,9 +1,13 @@
+import time
+from event_log import get_logger, EVENTS
+
+log = get_logger("motor_controller")
+
 try:
     import RPi.GPIO as GPIO
-    print("Imported RPi.GPIO successfully motor controller")
+    log.info("Imported RPi.GPIO successfully motor controller")
 except ImportError:
     from fake_gpio import GPIO
-import time
 
 class MotorController:
     def __init__(self):
@@ -38,14 +42,15 @@ class MotorController:
             "Motor 2 is moving in Clockwise",
             "Motor 2 is moving in Counter Clockwise"]
         
+        EVENTS.add("motors", controller="belt", array=list(motor_array))
         for i, message in enumerate(motor_messages):
             if motor_array[i]:
-                print(message)
+                log.debug(message)
 
     def stop_motors(self):
         for pin_number in self.relays.values():
             GPIO.output(pin_number,GPIO.LOW)
-        print("Motors stopped!")
+        log.debug("Motors stopped!")
     
     def set_stepper_position(self, target):
         steps_needed = target - self.current_position
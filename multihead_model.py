@@ -0,0 +1,81 @@
+import argparse
+import torch, timm
+import torch.nn as nn
+from event_log import get_logger
+
+log = get_logger("multihead_model")
+
+class MultiHeadGrader(nn.Module):
+    # one EfficientNetV2 backbone shared by the ripeness and bruises heads
+    def __init__(self, num_ripeness, num_bruises, model_name='tf_efficientnetv2_b3'):
+        super().__init__()
+        self.backbone = timm.create_model(model_name, pretrained=False, num_classes=0)
+        self.ripeness_head = nn.Linear(self.backbone.num_features, num_ripeness)
+        self.bruises_head = nn.Linear(self.backbone.num_features, num_bruises)
+
+    def forward(self, x):
+        features = self.backbone(x)
+        return self.ripeness_head(features), self.bruises_head(features)
+
+def split_classifier(state_dict):
+    backbone = {k: v for k, v in state_dict.items() if not k.startswith('classifier.')}
+    head = {'weight': state_dict['classifier.weight'], 'bias': state_dict['classifier.bias']}
+    return backbone, head
+
+def load_multihead_model(device, num_ripeness, num_bruises,
+                         ripeness_path="ripeness_v2b3.pth", bruises_path="bruises_v2b3.pth",
+                         merged_path=None, allow_unvalidated=False):
+    model = MultiHeadGrader(num_ripeness, num_bruises)
+    if merged_path:
+        model.load_state_dict(torch.load(merged_path, map_location=device))
+        log.info("Loaded merged multi-head checkpoint %s", merged_path)
+    else:
+        # The single-task checkpoints were trained with separate backbones: the
+        # bruises classifier put on the ripeness backbone sees features it was never
+        # trained on, so its predictions mean nothing until the head is retrained
+        # on the shared backbone. Only built on request, for that retraining.
+        if not allow_unvalidated:
+            raise ValueError("The multi-head model needs a merged checkpoint trained on the shared "
+                             "backbone (merged_path); building it from the two single-task "
+                             "checkpoints gives meaningless bruises predictions")
+        log.warning("Building the multi-head model from %s and %s: the bruises head was trained "
+                    "on another backbone, its predictions are not valid", ripeness_path, bruises_path)
+        ripeness_backbone, ripeness_head = split_classifier(
+            torch.load(ripeness_path, map_location=device))
+        _, bruises_head = split_classifier(torch.load(bruises_path, map_location=device))
+        model.backbone.load_state_dict(ripeness_backbone)
+        model.ripeness_head.load_state_dict(ripeness_head)
+        model.bruises_head.load_state_dict(bruises_head)
+        log.info("Built multi-head model from %s and %s", ripeness_path, bruises_path)
+    model = model.to(device)
+    model.eval()
+    return model
+
+def save_merged_checkpoint(model, merged_path):
+    torch.save(model.state_dict(), merged_path)
+    log.info("Saved merged multi-head checkpoint to %s", merged_path)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Start a multi-head checkpoint from the ripeness and bruises checkpoints "
+                    "(the bruises head must be retrained before it can grade)")
+    parser.add_argument("--ripeness", default="ripeness_v2b3.pth")
+    parser.add_argument("--bruises", default="bruises_v2b3.pth")
+    parser.add_argument("--num-ripeness", type=int, default=3)
+    parser.add_argument("--num-bruises", type=int, default=2)
+    parser.add_argument("--out", default="grader_multihead_v2b3.pth")
+    parser.add_argument("--allow-unvalidated", action="store_true",
+                        help="Save the untrained pairing anyway, e.g. as a starting point for "
+                             "fine-tuning the bruises head on the shared backbone")
+    args = parser.parse_args()
+
+    try:
+        model = load_multihead_model(torch.device("cpu"), args.num_ripeness, args.num_bruises,
+                                     args.ripeness, args.bruises,
+                                     allow_unvalidated=args.allow_unvalidated)
+    except ValueError as e:
+        parser.exit(1, f"{e}\nPass --allow-unvalidated to save it anyway (not for grading)\n")
+    save_merged_checkpoint(model, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+import torch
+
+def pad_box(box, image_shape, padding=0.15):
+    # Grows an [x1, y1, x2, y2] detection by `padding` of its width/height on every
+    # side and clips it to the frame, so the crop keeps a little context around
+    # the mango. Returns None if nothing usable is left.
+    x1, y1, x2, y2 = box
+    pad_x = (x2 - x1) * padding
+    pad_y = (y2 - y1) * padding
+    height, width = image_shape[:2]
+    x1, y1 = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+    x2, y2 = min(width, int(x2 + pad_x + 0.5)), min(height, int(y2 + pad_y + 0.5))
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return [x1, y1, x2, y2]
+
+class ArrayPreprocessor:
+    # Resize + ToTensor + Normalize straight from a capture_array() ndarray,
+    # written into a reusable float buffer instead of going through PIL.
+    def __init__(self, tf_params, batch_size=2):
+        self.size = (tf_params['py'], tf_params['px'])  # cv2 wants (width, height)
+        mean = np.array([tf_params['mean_r'], tf_params['mean_g'], tf_params['mean_b']], dtype=np.float32)
+        sd = np.array([tf_params['sd_r'], tf_params['sd_g'], tf_params['sd_b']], dtype=np.float32)
+        # (x / 255 - mean) / sd folded into one multiply-add per pixel
+        self.scale = torch.from_numpy(1.0 / (255.0 * sd))
+        self.shift = torch.from_numpy(-mean / sd)
+        self.buffer = self.allocate(batch_size)
+
+    def allocate(self, batch_size):
+        return torch.empty((batch_size, 3, self.size[1], self.size[0]), dtype=torch.float32)
+
+    def to_tensor(self, images, boxes=None):
+        # The returned batch is a view of self.buffer and is overwritten by the next call
+        if len(images) > self.buffer.shape[0]:
+            self.buffer = self.allocate(len(images))
+        batch = self.buffer[:len(images)]
+        for i, image in enumerate(images):
+            box = boxes[i] if boxes else None
+            self.fill(batch[i], image, box)
+        return batch
+
+    def fill(self, out, image, box=None):
+        if box is not None:
+            x1, y1, x2, y2 = [int(v) for v in box]
+            image = image[y1:y2, x1:x2]
+        # INTER_AREA is the cheap antialiased downscale, small ROIs get upscaled
+        # bilinearly; XBGR8888 frames keep their first three channels, same as
+        # Image.convert("RGB")
+        downscale = image.shape[1] >= self.size[0] and image.shape[0] >= self.size[1]
+        interpolation = cv2.INTER_AREA if downscale else cv2.INTER_LINEAR
+        resized = cv2.resize(image, self.size, interpolation=interpolation)[..., :3]
+        hwc = out.permute(1, 2, 0)
+        hwc.copy_(torch.from_numpy(resized))
+        hwc.mul_(self.scale).add_(self.shift)
+        return out
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# INT8 CPU inference for the ripeness and bruises classifiers.
+#
+#   python quantize_models.py calibrate --images 2025-01-01_10-00-00 --backend qnnpack
+#   python quantize_models.py report --images 2025-01-01_10-00-00
+#
+# Static post-training quantization of the whole network. Dynamic quantization is
+# not offered: it only covers nn.Linear, which in EfficientNetV2 is the final
+# classifier, so it gave no measurable speedup.
+
+import argparse
+import copy
+import glob
+import json
+import os
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+from event_log import get_logger
+
+log = get_logger("quantize_models")
+
+QUANTIZED_PATHS = {'ripeness': "ripeness_v2b3_int8.pt", 'bruises': "bruises_v2b3_int8.pt"}
+
+def set_backend(backend):
+    # fbgemm for x86 laptops, qnnpack for the Raspberry Pi (ARM)
+    torch.backends.quantized.engine = backend
+    log.info("Quantized engine: %s", backend)
+
+def freeze_same_padding(model, input_size=(300, 300)):
+    # tf_ timm models pad stride-2 convs dynamically, which FX tracing and export
+    # cannot follow. The input size is fixed, so swap them for a static pad + conv.
+    from timm.layers.conv2d_same import Conv2dSame
+    from timm.layers.padding import pad_same_arg
+
+    input_sizes = {}
+    hooks = [module.register_forward_pre_hook(
+                 lambda m, inputs, name=name: input_sizes.__setitem__(name, inputs[0].shape[-2:]))
+             for name, module in model.named_modules() if isinstance(module, Conv2dSame)]
+    with torch.no_grad():
+        model(torch.zeros(1, 3, *input_size, device=next(model.parameters()).device))
+    for hook in hooks:
+        hook.remove()
+
+    for name, size in input_sizes.items():
+        same = model.get_submodule(name)
+        conv = nn.Conv2d(same.in_channels, same.out_channels, same.kernel_size, same.stride,
+                         0, same.dilation, same.groups, same.bias is not None)
+        conv.load_state_dict(same.state_dict())
+        pad = nn.ZeroPad2d(pad_same_arg(size, same.weight.shape[-2:], same.stride, same.dilation))
+        parent, _, child = name.rpartition('.')
+        setattr(model.get_submodule(parent), child, nn.Sequential(pad, conv.to(same.weight.device)))
+    return model
+
+def split_norm_act(model):
+    # timm's BatchNormAct2d is a BatchNorm2d subclass with its own forward, which FX
+    # traces into a float F.batch_norm that prepare_fx cannot fold into the conv.
+    # A plain BatchNorm2d + activation lets conv+bn fuse into one quantized conv.
+    from timm.layers.norm_act import BatchNormAct2d
+
+    for name, module in list(model.named_modules()):
+        if not isinstance(module, BatchNormAct2d):
+            continue
+        bn = nn.BatchNorm2d(module.num_features, module.eps, module.momentum,
+                            module.affine, module.track_running_stats)
+        bn.load_state_dict(module.state_dict(), strict=False)
+        parent, _, child = name.rpartition('.')
+        setattr(model.get_submodule(parent), child,
+                nn.Sequential(bn.to(module.weight.device), module.drop, module.act))
+    return model
+
+def quantize_static_model(model, backend, calibration_batches, input_size=(300, 300)):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    set_backend(backend)
+    model = freeze_same_padding(copy.deepcopy(model).cpu().eval(), input_size)
+    model = split_norm_act(model).eval()
+    example = torch.zeros(1, 3, *input_size)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(backend), (example,))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    quantized = convert_fx(prepared)
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(quantized, example))
+
+def find_images(folder):
+    # session folders keep captures in Grade-X subfolders; skip RCNN annotations
+    paths = []
+    for ext in ("png", "jpg", "jpeg"):
+        paths += glob.glob(os.path.join(folder, "**", f"*.{ext}"), recursive=True)
+    return sorted(p for p in paths if "_measured" not in os.path.basename(p))
+
+def load_batches(ai, paths, batch_size=8):
+    for i in range(0, len(paths), batch_size):
+        images = [np.asarray(Image.open(p).convert("RGB")) for p in paths[i:i + batch_size]]
+        yield ai.preprocessor.to_tensor(images).clone()
+
+def create_analyzer():
+    from ai_analyzer import AIAnalyzer
+    RIPENESS_SCORES = {'green': 3.0, 'yellow': 1.0, 'yellow_green': 2.0}
+    BRUISES_SCORES = {'bruised': 1.0, 'unbruised': 2.0}
+    SIZE_SCORES = {'small': 1.0, 'medium': 2.0, 'large': 3.0}
+    return AIAnalyzer(torch.device("cpu"), RIPENESS_SCORES, BRUISES_SCORES, SIZE_SCORES)
+
+def calibrate(args):
+    ai = create_analyzer()
+    paths = find_images(args.images)[:args.max_images]
+    if not paths:
+        print(f"No images found under {args.images}")
+        return
+    print(f"Calibrating on {len(paths)} images")
+    for key, model in [('ripeness', ai.model_ripeness), ('bruises', ai.model_bruises)]:
+        quantized = quantize_static_model(model, args.backend, load_batches(ai, paths))
+        out_path = os.path.join(args.out_dir, QUANTIZED_PATHS[key])
+        torch.jit.save(quantized, out_path)
+        print(f"Saved {key} INT8 model to {out_path}")
+
+def time_model(model, batch):
+    with torch.no_grad():
+        start = time.perf_counter()
+        output = model(batch)
+    return output, time.perf_counter() - start
+
+def report(args):
+    set_backend(args.backend)
+    ai = create_analyzer()
+    paths = find_images(args.images)[:args.max_images]
+    if not paths:
+        print(f"No images found under {args.images}")
+        return
+    results = {}
+    for key, model in [('ripeness', ai.model_ripeness), ('bruises', ai.model_bruises)]:
+        quantized = torch.jit.load(os.path.join(args.out_dir, QUANTIZED_PATHS[key]))
+        agree = 0
+        fp32_time = int8_time = 0.0
+        warmup = next(load_batches(ai, paths, batch_size=1))
+        time_model(model, warmup)
+        time_model(quantized, warmup)
+        for batch in load_batches(ai, paths, batch_size=1):
+            fp32_out, t_fp32 = time_model(model, batch)
+            int8_out, t_int8 = time_model(quantized, batch)
+            agree += int(fp32_out.argmax(1).item() == int8_out.argmax(1).item())
+            fp32_time += t_fp32
+            int8_time += t_int8
+        n = len(paths)
+        results[key] = {'images': n,
+                        'agreement_with_fp32': agree / n,
+                        'fp32_ms_per_image': fp32_time / n * 1000,
+                        'int8_ms_per_image': int8_time / n * 1000,
+                        'speedup': fp32_time / int8_time}
+        r = results[key]
+        print(f"{key:9} agreement {r['agreement_with_fp32']*100:6.2f}%  "
+              f"fp32 {r['fp32_ms_per_image']:7.1f} ms  int8 {r['int8_ms_per_image']:7.1f} ms  "
+              f"speedup {r['speedup']:.2f}x")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({'mode': "static", 'backend': args.backend, 'models': results}, f, indent=2)
+        print(f"Report saved to {args.report}")
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 quantization for the grading classifiers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("calibrate", "report"):
+        p = sub.add_parser(name)
+        p.add_argument("--images", required=True, help="Session folder with saved captures")
+        p.add_argument("--backend", choices=["fbgemm", "qnnpack"], default="qnnpack")
+        p.add_argument("--max-images", type=int, default=200)
+        p.add_argument("--out-dir", default=".", help="Where the INT8 models are saved/loaded")
+    sub.choices["report"].add_argument("--report", default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.command == "calibrate":
+        calibrate(args)
+    else:
+        report(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
-import cv2, os, torch, torchvision, math
+import cv2, os, torch, math, time, statistics, logging
 import numpy as np
 from typing import List, Dict, Tuple
-from torchvision.models.detection import fasterrcnn_mobilenet_v3_large_fpn
+from event_log import get_logger, EVENTS
+
+log = get_logger("rcnn_size")
 
 class MangoMeasurementSystem:
-    def __init__(self, model_path, num_classes=7):
+    def __init__(self, model_path, num_classes=7, backend="torch", input_size=None):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.model = self.load_model(model_path, num_classes)
+        # 'torchscript'/'onnx' run the artifacts written by export_models.py
+        self.backend = backend
+        if self.backend != "torch":
+            from inference_backend import load_detector
+            self.model = load_detector(model_path, self.backend, self.device)
+        else:
+            self.model = self.load_model(model_path, num_classes)
+        self.set_input_size(input_size)
         
         self.class_names = {
             1: 'bruised', 2: 'not_bruised', 3: 'yellow',
@@ -19,11 +28,14 @@ class MangoMeasurementSystem:
 
     def load_model(self, model_path, num_classes=7):
         try:
-            print("Creating Faster R-CNN with MobileNetV3-Large backbone...")
+            from torchvision.models.detection import fasterrcnn_mobilenet_v3_large_fpn
+            log.info("Creating Faster R-CNN with MobileNetV3-Large backbone...")
             
-            model = fasterrcnn_mobilenet_v3_large_fpn(weights=None, num_classes=num_classes)
+            # the checkpoint holds the backbone too, skip the ImageNet download/load
+            model = fasterrcnn_mobilenet_v3_large_fpn(weights=None, weights_backbone=None,
+                                                      num_classes=num_classes)
             
-            print("Loading model weights...")
+            log.info("Loading model weights...")
             checkpoint = torch.load(model_path, map_location=self.device)
             
             if isinstance(checkpoint, dict):
@@ -39,49 +51,109 @@ class MangoMeasurementSystem:
             missing_keys, unexpected_keys = model.load_state_dict(model_state, strict=False)
             
             if missing_keys:
-                print(f"Missing keys: {len(missing_keys)}")
+                log.warning("Missing keys: %d", len(missing_keys))
             if unexpected_keys:
-                print(f"Unexpected keys: {len(unexpected_keys)}")
+                log.warning("Unexpected keys: %d", len(unexpected_keys))
             
             model.to(self.device)
             model.eval()
             
-            print(f"Model loaded successfully on {self.device}")
-            print(f"Classes: {num_classes}")
+            log.info("Model loaded successfully on %s, %d classes", self.device, num_classes)
             self.model = model
             
             return model
             
         except Exception as e:
-            print(f"Error loading model: {e}")
+            log.error("Error loading model: %s", e)
             return None    
     
     def get_size(self, img_path, confidence_threshold=0.2, save_annotated=True):
         image = cv2.imread(img_path)
         if image is None:
-            print(f"Could not load image: {img_path}")
+            log.warning("Could not load image: %s", img_path)
             return []
-        print("loaded img")
+        log.debug("loaded img")
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        save_path = img_path if save_annotated else None
+        return self.measure_array(image_rgb, confidence_threshold, save_path)
+
+    def to_tensor(self, image):
+        # RGB (or XBGR8888) HxWxC uint8 ndarray, or a CHW tensor already scaled to [0, 1]
+        if isinstance(image, torch.Tensor):
+            return image.float() if image.is_floating_point() else image.float() / 255.0
+        image_tensor = torch.from_numpy(image[..., :3]).permute(2, 0, 1)
+        return image_tensor.float() / 255.0
+
+    def set_input_size(self, input_size):
+        # Short side (px) the detector runs at, None keeps the full frame. The frame
+        # is shrunk as uint8 before the float conversion and the boxes are mapped
+        # back to full-res pixels, so pixels_per_cm stays valid.
+        self.input_size = input_size
+        transform = getattr(self.model, 'transform', None)
+        if transform is None:
+            # exported detectors keep the resize they were traced with
+            return
+        if not hasattr(self, 'default_transform_size'):
+            self.default_transform_size = (transform.min_size, transform.max_size)
+        if input_size:
+            # stop torchvision from resizing the already downscaled frame again
+            transform.min_size = (input_size,)
+            transform.max_size = input_size * 4
+        else:
+            transform.min_size, transform.max_size = self.default_transform_size
+
+    def downscale(self, image):
+        # returns the resized frame and its (x, y) scale, only ever shrinks
+        height, width = image.shape[:2]
+        scale = self.input_size / min(height, width)
+        if scale >= 1.0:
+            return image, None
+        size = (round(width * scale), round(height * scale))
+        resized = cv2.resize(image[..., :3], size, interpolation=cv2.INTER_AREA)
+        return resized, (size[0] / width, size[1] / height)
+
+    def detect(self, image):
+        scale = None
+        if self.input_size and isinstance(image, np.ndarray):
+            image, scale = self.downscale(image)
+        input_tensor = self.to_tensor(image).unsqueeze(0).to(self.device)
+        with torch.no_grad():
+            pred = self.model(input_tensor)[0]
+        if scale is not None:
+            sx, sy = scale
+            pred = dict(pred, boxes=pred['boxes'] / torch.tensor([sx, sy, sx, sy], device=pred['boxes'].device))
+        return pred
+
+    def warm_up(self, frame_size=(1080, 1920), runs=3):
+        # First detector call on a full camera frame is much slower than the rest
+        # (allocator, kernel selection); pay it here. Returns first vs steady ms.
+        if self.model is None:
+            return None
+        image = np.zeros((*frame_size, 3), dtype=np.uint8)
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            self.detect(image)
+            times.append((time.perf_counter() - start) * 1000)
+        self.warmup_stats = {'first_ms': times[0], 'steady_ms': statistics.median(times[1:])}
+        log.info("RCNN warm-up: first %.0f ms, steady %.0f ms", times[0], self.warmup_stats['steady_ms'])
+        return self.warmup_stats
+
+    def measure_array(self, image, confidence_threshold=0.2, save_path=None):
+        # Measures an already captured frame; the annotated copy is only written
+        # when save_path is given (named <save_path>_measured.<ext>)
         x1, y1, x2, y2 = self.reference_box
         ref_width_pixels = x2 - x1
         ref_height_pixels = y2 - y1
         ref_size_pixels = max(ref_width_pixels, ref_height_pixels)
         pixels_per_cm = ref_size_pixels / self.reference_size_cm
         
-        print(f"Calibration: {pixels_per_cm:.2f} pixels/cm")
+        log.debug("Calibration: %.2f pixels/cm", pixels_per_cm)
         
         if self.model is None:
-            print("Model not loaded")
+            log.error("Model not loaded")
             return []
-        print("loaded rcnn model")
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        image_tensor = torch.tensor(image_rgb, dtype=torch.float32).permute(2, 0, 1) / 255.0
-        input_tensor = image_tensor.unsqueeze(0).to(self.device)
-        
-        with torch.no_grad():
-            predictions = self.model(input_tensor)
-        
-        pred = predictions[0]
+        pred = self.detect(image)
         boxes = pred['boxes'].cpu().numpy()
         scores = pred['scores'].cpu().numpy()
         labels = pred['labels'].cpu().numpy()
@@ -121,23 +193,31 @@ class MangoMeasurementSystem:
             }
             results.append(result)
         
-        print(f"\nFound {len(results)} mangoes:")
-        for result in results:
-            print(f"Mango {result['mango_id']} ({result['class']}):")
-            print(f"  Length: {result['length_cm']} cm")
-            print(f"  Width: {result['width_cm']} cm") 
-            print(f"  Area: {result['area_cm2']} cm²")
-            print(f"  Confidence: {result['confidence']}")
+        EVENTS.add("detection", count=len(results),
+                   boxes=[(r['class'], float(r['confidence']), float(r['length_cm']), float(r['width_cm']))
+                          for r in results])
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Found %d mangoes:", len(results))
+            for result in results:
+                log.debug("Mango %s (%s): length %s cm, width %s cm, area %s cm², confidence %s",
+                          result['mango_id'], result['class'], result['length_cm'],
+                          result['width_cm'], result['area_cm2'], result['confidence'])
         
-        if save_annotated and results:
-            self._save_annotated_image(image, results, img_path)
+        if save_path and results:
+            self._save_annotated_image(self.to_rgb(image), results, save_path)
         
         return results
 
 
-    def _save_annotated_image(self, image, results, original_path):
-        
-        annotated_image = image.copy()
+    def to_rgb(self, image):
+        if isinstance(image, torch.Tensor):
+            image = (self.to_tensor(image) * 255).byte().permute(1, 2, 0).cpu().numpy()
+        return np.ascontiguousarray(image[..., :3])
+
+    def annotate(self, image, results):
+        # RGB copy of the frame with each box and its size drawn on; GradingEngine
+        # runs this on its ImageWriter thread, outside the grading path
+        annotated_image = self.to_rgb(image).copy()
         
         for result in results:
             box = result['bounding_box']
@@ -173,6 +253,10 @@ class MangoMeasurementSystem:
                 
                 cv2.putText(annotated_image, line, (x1 + 5, text_y), 
                            font, font_scale, (0, 0, 0), font_thickness)
+        return annotated_image
+
+    def _save_annotated_image(self, image, results, original_path):
+        annotated_image = cv2.cvtColor(self.annotate(image, results), cv2.COLOR_RGB2BGR)
         
         base_name = os.path.splitext(original_path)[0]
         extension = os.path.splitext(original_path)[1]
@@ -181,6 +265,6 @@ class MangoMeasurementSystem:
         success = cv2.imwrite(output_path, annotated_image)
         
         if success:
-            print(f"\nAnnotated image saved as: {output_path}")
+            log.debug("Annotated image saved as: %s", output_path)
         else:
-            print(f"Error: Could not save annotated image to {output_path}")
+            log.error("Could not save annotated image to %s", output_path)
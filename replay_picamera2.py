@@ -0,0 +1,145 @@
+import glob, os, threading, time
+import cv2
+import numpy as np
+from fake_picamera2 import FakePicamera2, sensor_timestamp
+from event_log import get_logger
+
+# Picamera2 stand-in that serves saved captures instead of FakePicamera2's noise,
+# so the RCNN and the classifiers see real mangoes in benchmarks. Point it at a
+# session folder (the Grade-A/B/C captures are found recursively):
+#   CameraManager(replay_dir="2025-01-01_10-00-00", replay_fps=10)
+#   MANGO_REPLAY_DIR=2025-01-01_10-00-00 python grading_engine.py --auto
+# Every frame is decoded and resized to the configured stream sizes up front, into
+# a .npy cache in the folder that later runs memory-map, so serving a frame is a
+# copy out of memory and the camera never limits the benchmark.
+# Stills (capture_array, which CameraManager.get_full_frame uses when replaying)
+# walk the captures in order whatever the preview thread does, so every run
+# grades the same frames; capture_request() only drives the preview.
+
+log = get_logger("replay_picamera2")
+
+REPLAY_DIR_ENV = "MANGO_REPLAY_DIR"
+REPLAY_FPS_ENV = "MANGO_REPLAY_FPS"
+
+def find_frames(folder):
+    # captures only, no RCNN annotated copies; top before bottom of each mango
+    paths = []
+    for ext in ("png", "jpg", "jpeg"):
+        paths += glob.glob(os.path.join(folder, "**", f"*.{ext}"), recursive=True)
+    paths = [p for p in paths if "_measured" not in os.path.basename(p)]
+    return sorted(paths, key=lambda p: os.path.basename(p).replace("_top", "_0").replace("_bottom", "_1"))
+
+class ReplayPicamera2(FakePicamera2):
+    def __init__(self, folder=None, fps=None, loop=True, max_frames=None, cache=True):
+        super().__init__()
+        self.folder = folder or os.environ.get(REPLAY_DIR_ENV)
+        fps = fps or os.environ.get(REPLAY_FPS_ENV)
+        # None serves frames as fast as they are asked for
+        self.fps = float(fps) if fps else None
+        self.loop = loop
+        self.cache = cache
+        self.paths = find_frames(self.folder)[:max_frames]
+        if not self.paths:
+            raise ValueError(f"No captures to replay in {self.folder}")
+        self.main = None
+        self.lores = None
+        self.index = -1
+        self.preview_index = -1
+        self.finished = False
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+        log.info("[Replay] %d frames from %s", len(self.paths), self.folder)
+
+    def configure(self, config):
+        super().configure(config)
+        main_size = config['main']['size']
+        self.main = self.load_main(main_size)
+        lores = config.get('lores')
+        if lores:
+            # the preview stream is small, keep it in memory as YUV420 like the Pi
+            width, height = lores['size']
+            self.lores = np.stack([cv2.cvtColor(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA),
+                                                cv2.COLOR_RGB2YUV_I420) for frame in self.main])
+
+    def load_main(self, size):
+        width, height = size
+        shape = (len(self.paths), height, width, 3)
+        cache_path = os.path.join(self.folder, f".replay_{width}x{height}_{len(self.paths)}.npy")
+        newest = max(os.path.getmtime(p) for p in self.paths)
+        if self.cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= newest:
+            frames = np.load(cache_path, mmap_mode="r")
+            if frames.shape == shape:
+                return frames
+        frames = None
+        if self.cache:
+            try:
+                # written under a temporary name so an interrupted decode is never reused
+                frames = np.lib.format.open_memmap(cache_path + ".tmp", mode="w+", dtype=np.uint8, shape=shape)
+            except OSError as e:
+                log.warning("[Replay] no frame cache (%s), decoding into memory", e)
+        if frames is None:
+            frames = np.empty(shape, dtype=np.uint8)
+        started = time.monotonic()
+        for i, path in enumerate(self.paths):
+            image = cv2.imread(path)
+            if image.shape[:2] != (height, width):
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=frames[i])
+        if isinstance(frames, np.memmap):
+            frames.flush()
+            os.replace(cache_path + ".tmp", cache_path)
+        log.info("[Replay] decoded %d frames in %.1fs", len(self.paths), time.monotonic() - started)
+        return frames
+
+    def next_index(self):
+        # next still, at most fps a second
+        with self.lock:
+            wait = 0.0
+            if self.fps:
+                now = time.monotonic()
+                wait = max(0.0, self.next_time - now)
+                self.next_time = max(now, self.next_time) + 1.0 / self.fps
+            if self.index + 1 >= len(self.paths) and not self.loop:
+                # out of frames: keep showing the last one
+                self.finished = True
+            else:
+                self.index = (self.index + 1) % len(self.paths)
+            index = self.index
+        if wait:
+            time.sleep(wait)
+        return index
+
+    def frame_array(self, name, index):
+        if not self.is_started:
+            raise RuntimeError("Camera not started")
+        frames = self.lores if name == "lores" else self.main
+        # copied like a real capture, callers may keep or modify it
+        return np.array(frames[max(index, 0)])
+
+    def capture_array(self, name="main"):
+        index = self.preview_index if name == "lores" else self.next_index()
+        return self.frame_array(name, index)
+
+    def capture_request(self, wait=None, flush=None):
+        if not self.is_started:
+            raise RuntimeError("Camera not started")
+        with self.lock:
+            self.preview_index = (self.preview_index + 1) % len(self.paths)
+            index = self.preview_index
+        return ReplayRequest(self, index)
+
+class ReplayRequest:
+    # main and lores of one request come from the same saved capture
+    def __init__(self, camera, index):
+        self.camera = camera
+        self.index = index
+        self.metadata = {'SensorTimestamp': sensor_timestamp()}
+
+    def make_array(self, name="main"):
+        return self.camera.frame_array(name, self.index)
+
+    def get_metadata(self):
+        return self.metadata
+
+    def release(self):
+        pass
@@ -0,0 +1,44 @@
+import os
+from get_size import load_json_file
+from event_log import get_logger
+
+log = get_logger("runtime_config")
+
+# Thread settings for inference on the Pi's four cores. runtime_config.json keys:
+#   torch_threads    intra-op threads per model call (null: torch default)
+#   interop_threads  inter-op threads, can only be set before torch runs anything
+#   inference_cpus   CPUs for the grading/inference threads, e.g. [1, 2, 3]
+#   ui_cpus          CPUs for the Tk and camera capture threads, e.g. [0]
+#   log_level        DEBUG brings back the per-inference/per-GPIO output
+#   event_log_size   events kept in the ring buffer (see event_log.py)
+# null leaves that setting alone.
+RUNTIME_CONFIG_PATH = "runtime_config.json"
+DEFAULT_RUNTIME_CONFIG = {'torch_threads': None, 'interop_threads': None,
+                          'inference_cpus': None, 'ui_cpus': None,
+                          'log_level': "INFO", 'event_log_size': 2000}
+
+def load_runtime_config(path=RUNTIME_CONFIG_PATH):
+    return dict(DEFAULT_RUNTIME_CONFIG, **load_json_file(path))
+
+def apply_torch_threads(config):
+    import torch
+    if config['torch_threads']:
+        torch.set_num_threads(config['torch_threads'])
+    if config['interop_threads']:
+        try:
+            torch.set_num_interop_threads(config['interop_threads'])
+        except RuntimeError as e:
+            # already fixed once any inter-op work has run in this process
+            log.warning("Could not set interop threads: %s", e)
+    log.info("Torch threads: %d intra-op, %d inter-op",
+             torch.get_num_threads(), torch.get_num_interop_threads())
+
+def pin_current_thread(cpus):
+    # Linux only; threads started afterwards from this thread inherit the mask,
+    # which is how torch's own worker threads end up on the same cores
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, cpus)
+    except (OSError, ValueError) as e:
+        log.warning("Could not pin thread to CPUs %s: %s", cpus, e)
@@ -1,9 +1,13 @@
+import time
+from event_log import get_logger, EVENTS
+
+log = get_logger("sorting")
+
 try:
     import RPi.GPIO as GPIO
-    print("Imported RPi.GPIO successfully sorting controller")
+    log.info("Imported RPi.GPIO successfully sorting controller")
 except ImportError:
     from fake_gpio import GPIO
-import time
 
 class SorterController:
     def __init__(self):
@@ -32,12 +36,13 @@ class SorterController:
             "Motor 4 is moving in Clockwise",
             "Motor 4 is moving in Counter Clockwise"]
         
+        EVENTS.add("motors", controller="sorter", array=list(motor_array))
         for i, message in enumerate(motor_messages):
             if motor_array[i]:
-                print(message)
+                log.debug(message)
 
     def stop_motors(self):
         for pin_number in self.relays.values():
             GPIO.output(pin_number,GPIO.LOW)
-        print("Motors stopped!")
+        log.debug("Motors stopped!")
     
@@ -0,0 +1,102 @@
+import json, math, threading, time
+from contextlib import contextmanager
+
+# Where the time goes between a capture and a grade on screen. Stages wrap their
+# work in a span and land in an in-memory histogram:
+#   with TIMER.span("rcnn"):
+#       ...
+#   TIMER.summary()   # {stage: {'count', 'mean', 'p50', 'p95', 'p99', 'max'}} in ms
+#   TIMER.dump(path)  # same as JSON
+# controller_v2.py shows the table with F2 and dumps it with F3, the headless
+# trigger loop prints it on "stats".
+
+# display order, stages not listed here are shown after these
+STAGES = ["capture", "png_save", "transform", "ripeness", "bruises", "classifiers",
+          "rcnn", "grading", "ui_update", "capture_to_result"]
+
+class Histogram:
+    # Log-linear buckets like HdrHistogram: every value (integer microseconds) is
+    # kept to within 1/2**(precision_bits - 1) of itself, in a few hundred
+    # buckets at most, so recording stays O(1) however long the run is.
+    def __init__(self, precision_bits=6):
+        self.precision_bits = precision_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        value = max(0, int(value))
+        shift = max(0, value.bit_length() - self.precision_bits)
+        key = (shift, value >> shift)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        # highest value of the bucket the p-th percentile falls in, like HdrHistogram
+        if not self.count:
+            return 0
+        target = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for shift, sub in sorted(self.counts):
+            seen += self.counts[(shift, sub)]
+            if seen >= target:
+                return min(((sub + 1) << shift) - 1, self.max)
+        return self.max
+
+class StageTimer:
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, ms):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.record(ms * 1000)
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def summary(self, percentiles=(50, 95, 99)):
+        with self.lock:
+            histograms = dict(self.histograms)
+        order = STAGES + sorted(set(histograms) - set(STAGES))
+        summary = {}
+        for stage in order:
+            histogram = histograms.get(stage)
+            if histogram is None or not histogram.count:
+                continue
+            row = {'count': histogram.count, 'mean': histogram.total / histogram.count / 1000}
+            for p in percentiles:
+                row[f"p{p}"] = histogram.percentile(p) / 1000
+            row['max'] = histogram.max / 1000
+            summary[stage] = row
+        return summary
+
+    def format_table(self):
+        lines = [f"{'stage':18} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8}"]
+        for stage, row in self.summary().items():
+            lines.append(f"{stage:18} {row['count']:>5} {row['p50']:>8.1f} "
+                         f"{row['p95']:>8.1f} {row['p99']:>8.1f}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        summary = self.summary()
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+TIMER = StageTimer()
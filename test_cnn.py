@@ -125,6 +125,18 @@ Examples:
                        action="store_true",
                        help="Test bruises classification only")
     
+    parser.add_argument("--multihead", 
+                       action="store_true",
+                       help="Use the shared-backbone multi-head model")
+    
+    parser.add_argument("--merged", 
+                       default=None,
+                       help="Merged multi-head checkpoint, required with --multihead")
+    
+    parser.add_argument("--allow-unvalidated", 
+                       action="store_true",
+                       help="Build the multi-head model from the two checkpoints (bruises not valid)")
+    
     parser.add_argument("--device", 
                        choices=['auto', 'cpu', 'cuda'],
                        default='auto',
@@ -155,7 +167,9 @@ Examples:
     
     print("Initializing AI Analyzer...")
     try:
-        analyzer = AIAnalyzer(device, RIPENESS_SCORES, BRUISES_SCORES, SIZE_SCORES)
+        analyzer = AIAnalyzer(device, RIPENESS_SCORES, BRUISES_SCORES, SIZE_SCORES,
+                              multihead=args.multihead, merged_path=args.merged,
+                              allow_unvalidated=args.allow_unvalidated)
     except Exception as e:
         print(f"Error initializing AI Analyzer: {e}")
         print("Make sure the model files (ripeness_v2b3.pth, bruises_v2b3.pth) are in the current directory")